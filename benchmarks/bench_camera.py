@@ -0,0 +1,88 @@
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import pygame as pg
+
+import settings as st
+import utilities as utils
+
+
+'''
+Measures the sprite draw loop with the camera transforms: a new rect per
+sprite (Camera.apply or moving by Camera.offset, like render.RenderGroup)
+against one batch transform into the camera's reusable rect buffer
+(Camera.apply_rects), and the cost of the transforms alone without
+blitting.
+
+    python benchmarks/bench_camera.py
+'''
+
+
+class FakeGame():
+    def __init__(self):
+        self.world_screen_rect = pg.Rect(0, st.GUI_HEIGHT, st.GAME_SCREEN_W,
+                                         st.GAME_SCREEN_H - st.GUI_HEIGHT)
+
+
+class FakeSprite():
+    def __init__(self, image, x, y):
+        self.image = image
+        self.rect = image.get_rect(topleft=(x, y))
+
+
+def make_sprites(count, map_size):
+    rnd = random.Random(count)
+    image = pg.Surface((16, 16), pg.SRCALPHA)
+    image.fill((200, 50, 50, 255))
+    return [FakeSprite(image, rnd.randrange(map_size), rnd.randrange(map_size))
+            for _ in range(count)]
+
+
+def draw_apply(screen, camera, sprites):
+    for sprite in sprites:
+        screen.blit(sprite.image, camera.apply(sprite))
+
+
+def draw_offset(screen, camera, sprites):
+    offset = camera.offset
+    for sprite in sprites:
+        screen.blit(sprite.image, sprite.rect.move(offset))
+
+
+def draw_apply_rects(screen, camera, sprites):
+    rects = camera.apply_rects([sprite.rect for sprite in sprites])
+    for sprite, rect in zip(sprites, rects):
+        screen.blit(sprite.image, rect)
+
+
+def main(count=500, number=2000):
+    pg.init()
+    screen = pg.Surface((st.GAME_SCREEN_W, st.GAME_SCREEN_H))
+    map_size = 640
+    camera = utils.Camera(FakeGame(), map_size, map_size)
+    sprites = make_sprites(count, map_size)
+    target = sprites[0]
+    camera.update(target)
+
+    loops = {
+            'apply': lambda: draw_apply(screen, camera, sprites),
+            'offset': lambda: draw_offset(screen, camera, sprites),
+            'apply_rects': lambda: draw_apply_rects(screen, camera, sprites),
+            'apply only': lambda: [camera.apply(s) for s in sprites],
+            'apply_rects only':
+                lambda: camera.apply_rects([s.rect for s in sprites]),
+            'update': lambda: camera.update(target)
+            }
+    print(f'{count} sprites, {number} frames')
+    for name, loop in loops.items():
+        t = timeit.timeit(loop, number=number) / number
+        print(f'{name:18} {t * 1e6:8.1f} us per frame')
+    pg.quit()
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
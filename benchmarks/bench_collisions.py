@@ -0,0 +1,77 @@
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import pygame as pg
+
+import collisions
+
+
+'''
+Compares the collision manager (collisions.py) with testing every weapon
+against every enemy and every enemy against the player (like
+pg.sprite.spritecollide per sprite) for an increasing number of enemies 
+and projectile-like weapons on a 640x640 map.
+
+    python benchmarks/bench_collisions.py
+'''
+
+
+class Collider(pg.sprite.Sprite):
+    def __init__(self, layer, mask, x, y, size):
+        super().__init__()
+        self.collision_layer = layer
+        self.collision_mask = mask
+        self.rect = self.hitbox = pg.Rect(x, y, size, size)
+        self.hits = 0
+
+    def on_collision(self, other):
+        self.hits += 1
+
+
+def make_colliders(enemies, weapons, map_size=640):
+    rnd = random.Random(enemies)
+    def pos():
+        return rnd.randrange(map_size - 16), rnd.randrange(map_size - 16)
+    player = Collider(collisions.PLAYER, 0, *pos(), 12)
+    enemy_list = [Collider(collisions.ENEMY, collisions.PLAYER, *pos(), 12)
+                  for _ in range(enemies)]
+    weapon_list = [Collider(collisions.WEAPON, collisions.ENEMY, *pos(), 8)
+                   for _ in range(weapons)]
+    return player, enemy_list, weapon_list
+
+
+def collide_hitbox(one, two):
+    return one.hitbox.colliderect(two.hitbox)
+
+
+def pairwise(player, enemies, weapons):
+    for weapon in weapons:
+        for enemy in pg.sprite.spritecollide(weapon, enemies, False, 
+                                             collide_hitbox):
+            weapon.on_collision(enemy)
+    for enemy in enemies:
+        if enemy.hitbox.colliderect(player.hitbox):
+            enemy.on_collision(player)
+
+
+def main(number=50):
+    manager = collisions.CollisionManager(32)
+    print(f'{"enemies":>8} {"weapons":>8} {"pairwise":>10} {"manager":>10}')
+    for enemies, weapons in [(100, 10), (500, 50), (1000, 100), (2000, 200)]:
+        player, enemy_list, weapon_list = make_colliders(enemies, weapons)
+        group = pg.sprite.Group(enemy_list)
+        sprites = [player] + enemy_list + weapon_list
+        t_pair = timeit.timeit(lambda: pairwise(player, group, weapon_list),
+                               number=number) / number
+        t_manager = timeit.timeit(lambda: manager.update(sprites),
+                                  number=number) / number
+        print(f'{enemies:8} {weapons:8} {t_pair * 1000:7.2f} ms '
+              f'{t_manager * 1000:7.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.chdir(sys.path[0])
+
+import pygame as pg
+
+import dungeons
+import game
+
+
+'''
+Measures the generation of procedural dungeons (see dungeons.py) with an 
+increasing number of rooms: the layout, the map data of all rooms, the
+grid of Maps (the rooms are baked and spawned when they are entered) and
+the same grid again from the caches.
+
+    python benchmarks/bench_dungeons.py
+'''
+
+
+def main(seed=1):
+    g = game.Game()
+    print(f'{"rooms":>8} {"layout":>10} {"room data":>10} '
+          f'{"grid":>10} {"cached":>10}')
+    for rooms in [10, 100, 1000]:
+        start = time.perf_counter()
+        layout = dungeons.generate_layout(seed, rooms)
+        t_layout = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for x, y in layout.doors:
+            dungeons.room_data(layout, x, y, None)
+        t_rooms = time.perf_counter() - start
+
+        start = time.perf_counter()
+        g.dungeons.create_grid(g.dungeons.get_layout(seed, rooms))
+        t_grid = time.perf_counter() - start
+
+        start = time.perf_counter()
+        g.dungeons.create_grid(g.dungeons.get_layout(seed, rooms))
+        t_cached = time.perf_counter() - start
+        print(f'{rooms:8} {t_layout * 1000:7.2f} ms {t_rooms * 1000:7.2f} ms '
+              f'{t_grid * 1000:7.2f} ms {t_cached * 1000:7.2f} ms')
+    g.autosave_writer.close()
+    pg.quit()
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.chdir(sys.path[0])
+
+import pygame as pg
+
+import game
+import sprites
+
+
+'''
+Measures the update time of the in game state (sprite states and the
+systems of the component store, see components.py) for an increasing 
+number of enemies on the first overworld map.
+
+    python benchmarks/bench_enemies.py
+'''
+
+
+def add_enemies(g, count):
+    for sprite in list(g.enemies):
+        sprite.kill()
+    map_ = g.map
+    for i in range(count):
+        x = 32 + (i * 37) % int(map_.size.x - 64)
+        y = 32 + (i * 53) % int(map_.size.y - 64)
+        enemy = g.sprite_pools.spawn(sprites.Enemy, g, 
+                                     {'id': 10000 + i, 'name': 'Enemy', 
+                                      'x': x, 'y': y, 'width': 16, 'height': 16})
+        # wander around instead of chasing the player
+        enemy.aggro_dist = 0
+
+
+def main(frames=100, dt=0.01):
+    g = game.Game()
+    g.running = True
+    g.change_state('GameStart')
+    g.change_state('InGame')
+    print(f'{"enemies":>8} {"update":>10}')
+    for count in [100, 500, 1000, 2000]:
+        add_enemies(g, count)
+        start = time.perf_counter()
+        for _ in range(frames):
+            g.state.update(dt)
+        t = (time.perf_counter() - start) / frames
+        print(f'{count:8} {t * 1000:7.2f} ms')
+    g.autosave_writer.close()
+    g.regions.close()
+    pg.quit()
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,87 @@
+import os
+import sys
+import timeit
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import pygame as pg
+import controls
+
+
+'''
+Microbenchmark of the per frame input processing (KeyGetter.get_input)
+compared to the previous implementation that built new dicts every frame
+and searched the key mappings for every event.
+
+    python benchmarks/bench_input.py
+'''
+
+
+class DummyGame():
+    pass
+
+
+def legacy_get_input(game, mapping, pad, events):
+    # the dict based implementation this replaced, for comparison
+    game.keys_pressed = {key: 0 for key in mapping.keys()}
+    key_presses = pg.key.get_pressed()
+    for key, value in mapping.items():
+        if not pad.inputs:
+            if key_presses[value]:
+                game.keys_pressed[key] = 1
+        else:
+            if (pad.inputs[0][pad.button_mapping[key]] or key_presses[value]):
+                game.keys_pressed[key] = 1
+    game.keydown = {key: 0 for key in mapping.keys()}
+    game.keyup = {key: 0 for key in mapping.keys()}
+    for event in events:
+        if event.type == pg.KEYDOWN:
+            for key, value in mapping.items():
+                if event.key == value:
+                    game.keydown[key] = 1
+        elif event.type == pg.KEYUP:
+            for key, value in mapping.items():
+                if event.key == value:
+                    game.keyup[key] = 1
+    for key, value in pad.button_mapping.items():
+        if pad.inputs_down and pad.inputs_down[0][value]:
+            game.keydown[key] = 1
+        elif pad.inputs_up and pad.inputs_up[0][value]:
+            game.keyup[key] = 1
+
+
+def main(frames=20000):
+    pg.init()
+    pg.display.set_mode((1, 1))
+    game = DummyGame()
+    game.gamepad_controller = controls.GamepadController()
+    key_getter = controls.KeyGetter(game)
+    pad = game.gamepad_controller
+    
+    event_lists = {
+        'no events': [],
+        '4 key events': [pg.event.Event(pg.KEYDOWN, key=pg.K_d),
+                         pg.event.Event(pg.KEYDOWN, key=pg.K_n),
+                         pg.event.Event(pg.KEYUP, key=pg.K_d),
+                         pg.event.Event(pg.KEYUP, key=pg.K_n)],
+        }
+    
+    for label, events in event_lists.items():
+        new = timeit.timeit(lambda: key_getter.get_input(pad, events), 
+                            number=frames)
+        old = timeit.timeit(lambda: legacy_get_input(game, key_getter.keyboard_mapping,
+                                                     pad, events), 
+                            number=frames)
+        print(f'{label:14} get_input {new / frames * 1e6:6.2f} us/frame   '
+              f'previous {old / frames * 1e6:6.2f} us/frame')
+    
+    # reading the inputs like the player sprite does
+    keys = game.keys_pressed
+    read = timeit.timeit(lambda: keys['RIGHT'] - keys['LEFT'], number=frames)
+    print(f'reading one input through the view: {read / frames * 1e6:.2f} us')
+    pg.quit()
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.chdir(sys.path[0])
+
+import pygame as pg
+
+import game
+import regions
+
+
+'''
+Measures the main thread time of one simulation round of an off-screen
+map (see regions.py) for an increasing number of enemies: simulated
+inline on the main thread, and sent to the worker processes (the time 
+until submit returns, and the time until the result is back).
+
+    python benchmarks/bench_regions.py
+'''
+
+
+def main(rounds=20, steps=4):
+    g = game.Game()
+    g.running = True
+    g.change_state('GameStart')
+    simulator = g.regions
+    simulator.start()
+    map_ = g.overworld_grid.get_map_at(1, 0)
+    region = regions.region_data(map_)
+    print(f'{"enemies":>8} {"inline":>10} {"submit":>10} {"result":>10}')
+    for count in [100, 1000, 10000]:
+        entities = array('d')
+        for i in range(count):
+            entities.extend((10000 + i, 32 + (i * 37) % int(map_.size.x - 64),
+                             32 + (i * 53) % int(map_.size.y - 64), 0))
+        inline = submit = result = 0
+        for seed in range(rounds):
+            start = time.perf_counter()
+            regions.simulate_region(region, array('d', entities), steps, seed)
+            inline += time.perf_counter() - start
+
+            start = time.perf_counter()
+            future = simulator.executor.submit(regions.simulate_region, region, 
+                                               entities, steps, seed)
+            submit += time.perf_counter() - start
+            future.result()
+            result += time.perf_counter() - start
+        print(f'{count:8} {inline / rounds * 1000:7.2f} ms '
+              f'{submit / rounds * 1000:7.2f} ms {result / rounds * 1000:7.2f} ms')
+    g.autosave_writer.close()
+    simulator.close()
+    pg.quit()
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
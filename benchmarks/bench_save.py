@@ -0,0 +1,75 @@
+import gzip
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import savefile
+
+
+'''
+Compares the file size and the load time of the binary save format
+(savefile.py) with json and compressed json saves for worlds with an
+increasing number of saved entities.
+
+    python benchmarks/bench_save.py
+'''
+
+
+def make_save(entities, maps=10):
+    rnd = random.Random(entities)
+    data = {
+            'version': savefile.VERSION,
+            'map': 'data/tilemaps/overworld1.tmx',
+            'map_index': [0, 0],
+            'grid': 'overworld',
+            'player': {'pos': [182.0, 136.0], 'lastdir': 1, 'hp': 3.0,
+                       'max_hp': 14.0, 'mana': 10, 'max_mana': 10,
+                       'item_counts': {'rupee': 12}},
+            'items': {'A': 'Sword', 'B': None},
+            'inventory': [['Sword', 'Test', None, None, None]] +
+                         [[None] * 5 for _ in range(4)]
+            }
+    records = {}
+    for m in range(maps):
+        key = f'data/tilemaps/map{m}.tmx'
+        records[key] = {i: {'pos': [rnd.uniform(0, 800), rnd.uniform(0, 600)],
+                            'lastdir': rnd.randrange(4),
+                            'hp': rnd.randrange(1, 3),
+                            'type': 'Enemy',
+                            'alive': rnd.random() > 0.3}
+                        for i in range(entities // maps)}
+    return data, records
+
+
+def json_save(data, records):
+    maps = {key: {str(id_): values for id_, values in entities.items()}
+            for key, entities in records.items()}
+    return json.dumps(dict(data, maps=maps)).encode('utf-8')
+
+
+def main(number=20):
+    print(f'{"entities":>8} {"format":12} {"size":>10} {"load":>10}')
+    for entities in [100, 1000, 10000, 100000]:
+        data, records = make_save(entities)
+        json_data = json_save(data, records)
+        files = {
+                'json': (json_data, json.loads),
+                'json.gz': (gzip.compress(json_data),
+                            lambda d: json.loads(gzip.decompress(d))),
+                'binary': (savefile.dumps(data, records), savefile.loads)
+                }
+        assert savefile.loads(files['binary'][0])['maps'] == records
+
+        for name, (file_data, load) in files.items():
+            n = max(1, number * 1000 // entities)
+            t = timeit.timeit(lambda: load(file_data), number=n) / n
+            print(f'{entities:8} {name:12} {len(file_data) / 1024:8.1f} KB '
+                  f'{t * 1000:7.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
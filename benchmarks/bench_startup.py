@@ -0,0 +1,58 @@
+import os
+import subprocess
+import sys
+import time
+
+
+'''
+Cold start benchmark: measures the wall time from process start until the
+TitleScreen is set up, and until the first map is loaded (GameStart),
+once with the compiled asset bundle and once with the source files.
+
+Compile the bundle first (python src/compile_assets.py), then run
+    python benchmarks/bench_startup.py [runs]
+'''
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+# code that runs in a fresh interpreter for every measurement
+DRIVER = '''
+import os, sys
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+sys.path.insert(0, {src!r})
+import settings as st
+st.USE_ASSET_BUNDLE = {bundle}
+import game
+g = game.Game()
+if {ingame}:
+    g.change_state('GameStart')
+'''
+
+
+def cold_start(bundle, ingame):
+    code = DRIVER.format(src=SRC_DIR, bundle=bundle, ingame=ingame)
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], cwd=SRC_DIR, check=True,
+                   stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main(runs=10):
+    bundle_file = os.path.join(SRC_DIR, '..', 'data', 'assets.bundle')
+    if not os.path.exists(bundle_file):
+        print('No asset bundle found, run compile_assets.py first')
+        return
+    
+    for ingame, label in [(False, 'TitleScreen'), (True, 'GameStart')]:
+        for bundle in [False, True]:
+            # the first run warms up the OS file cache
+            cold_start(bundle, ingame)
+            times = sorted(cold_start(bundle, ingame) for _ in range(runs))
+            source = 'bundle' if bundle else 'sources'
+            print(f'{label:12} {source:8} median {times[runs // 2] * 1000:7.1f} ms'
+                  f'   min {times[0] * 1000:7.1f} ms')
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
\ No newline at end of file
@@ -0,0 +1,189 @@
+import pygame as pg
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+
+
+
+class ChannelPool():
+    '''
+    distributes sound effects over a fixed set of mixer channels
+    every category (like 'weapon' or 'enemy') can only use a limited number
+    of voices at the same time. If the category or the whole pool is full,
+    the playing sound with the lowest priority (and the oldest of those)
+    is stopped to make room, unless the new sound has a lower priority.
+    '''
+    def __init__(self, channels, voice_limits):
+        self.channels = channels
+        self.voice_limits = voice_limits
+        # (category, priority, play order) of the last sound on each channel
+        self.voices = [None for _ in channels]
+        self.counter = count()
+
+
+    def play(self, sound, volume=1, category='default', priority=0):
+        '''
+        plays a sound and returns the channel it is played on
+        or None if the sound was dropped
+        '''
+        limit = self.voice_limits.get(category, self.voice_limits['default'])
+        if limit <= 0:
+            return None
+        free = None
+        busy = []
+        same_category = []
+        for i, channel in enumerate(self.channels):
+            if channel.get_busy():
+                busy.append(i)
+                if self.voices[i][0] == category:
+                    same_category.append(i)
+            elif free is None:
+                free = i
+
+        index = None
+        candidates = ()
+        if len(same_category) >= limit:
+            candidates = same_category
+        elif free is not None:
+            index = free
+        else:
+            candidates = busy
+
+        if candidates:
+            # steal the voice with the lowest priority, oldest first
+            index = min(candidates, key=lambda i: self.voices[i][1:])
+            if self.voices[index][1] > priority:
+                return None
+            self.channels[index].stop()
+
+        if index is None:
+            # there are no channels
+            return None
+        channel = self.channels[index]
+        channel.play(sound)
+        channel.set_volume(volume)
+        self.voices[index] = (category, priority, next(self.counter))
+        return channel
+
+
+    def stop(self):
+        for channel in self.channels:
+            channel.stop()
+
+
+
+class MusicPlayer():
+    '''
+    streams music tracks with pg.mixer.music, so only a small part of a
+    track is decoded at a time instead of the whole track (about 10 MB per
+    minute of music). There is only one music stream: changing the music
+    fades the current track out and the next one in when the fade out is
+    done (see update). Loading a stream only reads the file header, so this
+    never blocks a frame
+    '''
+    def __init__(self, fade_ms):
+        self.fade_ms = fade_ms
+        # the track that is playing
+        self.filename = None
+        # (filename, volume, loops) of the track that starts after the fade out
+        self.next = None
+
+
+    def play(self, filename, volume=1, loops=-1):
+        if (filename == self.filename and self.next is None and 
+                pg.mixer.music.get_busy()):
+            pg.mixer.music.set_volume(volume)
+            return
+        self.next = (filename, volume, loops)
+        if pg.mixer.music.get_busy():
+            pg.mixer.music.fadeout(self.fade_ms)
+        else:
+            self.update()
+
+
+    def update(self):
+        # start the next track when the last one has faded out
+        if self.next and not pg.mixer.music.get_busy():
+            filename, volume, loops = self.next
+            self.next = None
+            pg.mixer.music.load(filename)
+            pg.mixer.music.set_volume(volume)
+            pg.mixer.music.play(loops, fade_ms=self.fade_ms)
+            self.filename = filename
+
+
+    def set_volume(self, volume):
+        pg.mixer.music.set_volume(volume)
+
+
+    def stop(self):
+        self.next = None
+        self.filename = None
+        pg.mixer.music.fadeout(self.fade_ms)
+
+
+
+def sound_size(sound):
+    '''returns the decoded size of a sound in bytes'''
+    frequency, size, channels = pg.mixer.get_init()
+    return int(sound.get_length() * frequency * channels * abs(size) // 8)
+
+
+
+class SoundCache():
+    '''
+    decodes sound files on first use and keeps them in a least recently 
+    used cache that is limited by the decoded size in bytes
+    sounds can be decoded in advance in a background thread (prewarm), 
+    so their first use doesn't have to wait for the decoding
+    '''
+    def __init__(self, budget):
+        self.budget = budget
+        # filename: (sound, size), least recently used first
+        self.sounds = OrderedDict()
+        self.size = 0
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        # filename: future of the sounds that are being prewarmed
+        self.loading = {}
+
+
+    def get(self, filename):
+        if filename in self.sounds:
+            self.sounds.move_to_end(filename)
+            return self.sounds[filename][0]
+
+        if filename in self.loading:
+            # wait for the background thread instead of decoding twice
+            sound = self.loading.pop(filename).result()
+        else:
+            sound = pg.mixer.Sound(filename)
+        self.add(filename, sound)
+        return sound
+
+
+    def add(self, filename, sound):
+        size = sound_size(sound)
+        # remove the least recently used sounds until the new one fits
+        # (sounds that are still playing keep playing)
+        while self.sounds and self.size + size > self.budget:
+            _, (_, old_size) = self.sounds.popitem(last=False)
+            self.size -= old_size
+        self.sounds[filename] = (sound, size)
+        self.size += size
+
+
+    def prewarm(self, filenames):
+        for filename in filenames:
+            if filename in self.sounds:
+                self.sounds.move_to_end(filename)
+            elif filename not in self.loading:
+                self.loading[filename] = self.executor.submit(pg.mixer.Sound, 
+                                                              filename)
+
+
+    def update(self):
+        # move prewarmed sounds into the cache when they are decoded
+        for filename, future in list(self.loading.items()):
+            if future.done():
+                del self.loading[filename]
+                self.add(filename, future.result())
\ No newline at end of file
@@ -0,0 +1,107 @@
+import pygame as pg
+import os
+import json
+
+from load_assets import is_strip, strip_rects
+
+
+'''
+Packs all image strips from assets/manifest.json into a few atlas pages
+in assets/graphics/atlas and writes an index (atlas.json) with the rects of
+every frame. The Loader uses the atlas if it is newer than its sources.
+
+Run this from the src directory whenever the graphics or the manifest change:
+    python build_atlas.py
+'''
+
+# maximum size of an atlas page in pixels
+PAGE_SIZE = 1024
+# empty pixels between two images (prevents bleeding when scaling)
+PADDING = 1
+
+
+def pack(sizes, page_size=PAGE_SIZE, padding=PADDING):
+    '''
+    simple shelf packing: images are sorted by height and put in rows
+    Args:
+        sizes: dict with name: (width, height)
+    returns a dict with name: (page, x, y) and the used size of each page
+    '''
+    positions = {}
+    page_sizes = [[0, 0]]
+    x = y = shelf_h = 0
+    for name in sorted(sizes, key=lambda n: (-sizes[n][1], -sizes[n][0])):
+        w, h = sizes[name]
+        if w > page_size or h > page_size:
+            raise ValueError(f'{name} is too big for an atlas page')
+        if x + w > page_size:
+            # start a new shelf
+            x = 0
+            y += shelf_h + padding
+            shelf_h = 0
+        if y + h > page_size:
+            # start a new page
+            page_sizes.append([0, 0])
+            x = y = shelf_h = 0
+        positions[name] = (len(page_sizes) - 1, x, y)
+        page_sizes[-1][0] = max(page_sizes[-1][0], x + w)
+        page_sizes[-1][1] = max(page_sizes[-1][1], y + h)
+        x += w + padding
+        shelf_h = max(shelf_h, h)
+    return positions, page_sizes
+
+
+def build(base_dir):
+    graphics_folder = os.path.join(base_dir, 'assets', 'graphics')
+    atlas_folder = os.path.join(graphics_folder, 'atlas')
+    with open(os.path.join(base_dir, 'assets', 'manifest.json')) as f:
+        manifest = json.load(f)
+    
+    entries = manifest['graphics']
+    # pack every source image as a whole, so strips that are sliced in 
+    # different ways (like arrows.png) are only stored once
+    files = sorted({entry['file'] for entry in entries.values()})
+    images = {f: pg.image.load(os.path.join(graphics_folder, f)) for f in files}
+    positions, page_sizes = pack({f: img.get_size() for f, img in images.items()})
+    
+    pages = [pg.Surface(size, pg.SRCALPHA) for size in page_sizes]
+    for page in pages:
+        page.fill((0, 0, 0, 0))
+    for f, img in images.items():
+        page, x, y = positions[f]
+        pages[page].blit(img, (x, y))
+    
+    if not os.path.exists(atlas_folder):
+        os.makedirs(atlas_folder)
+    page_names = []
+    for i, page in enumerate(pages):
+        name = f'atlas{i}.png'
+        pg.image.save(page, os.path.join(atlas_folder, name))
+        page_names.append(name)
+    
+    # frame rects as [page, x, y, w, h] in atlas coordinates
+    frames = {}
+    for key, entry in entries.items():
+        page, x, y = positions[entry['file']]
+        size = images[entry['file']].get_size()
+        if is_strip(entry):
+            rects = strip_rects(size, entry.get('frames'), 
+                                entry.get('tilesize'), entry.get('rows', 1))
+        else:
+            rects = [pg.Rect((0, 0), size)]
+        frames[key] = [[page, r.x + x, r.y + y, r.w, r.h] for r in rects]
+    
+    index = {
+            'pages': page_names,
+            'sources': files,
+            'frames': frames
+            }
+    with open(os.path.join(atlas_folder, 'atlas.json'), 'w') as f:
+        json.dump(index, f)
+    
+    print(f'Packed {len(files)} images into {len(pages)} atlas page(s): '
+          f'{", ".join(f"{w}x{h}" for w, h in page_sizes)}')
+
+
+if __name__ == '__main__':
+    build(os.path.join(os.path.dirname(__file__), '..'))
\ No newline at end of file
@@ -0,0 +1,145 @@
+import pygame as pg
+import json
+import mmap
+import os
+import struct
+
+
+'''
+Binary asset bundle written by compile_assets.py
+
+Layout:
+    header: magic bytes, format version, length of the table of contents
+    table of contents: utf-8 json with all metadata (map sizes, layer infos,
+                       object lists, tile animations, texts, source file
+                       times) and the
+                       [offset, length] references of the binary blobs
+    blobs: tile index arrays (uint32) and RGBA tile pixels, 8 byte aligned
+
+The file is memory mapped, so tile index arrays are used directly from the
+mapped pages without copying.
+'''
+
+MAGIC = b'DCBUNDLE'
+VERSION = 2
+HEADER = struct.Struct('<8sII')
+ALIGN = 8
+
+
+def align(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def bundle_key(base_dir, filename):
+    # bundle entries are stored by their path relative to the game folder
+    return os.path.relpath(filename, base_dir).replace(os.sep, '/')
+
+
+
+class BundleWriter():
+    def __init__(self):
+        self.blobs = []
+        self.size = 0
+
+
+    def add_blob(self, data):
+        '''
+        adds binary data to the bundle
+        returns the [offset, length] reference to store in the contents
+        '''
+        data = bytes(data)
+        ref = [self.size, len(data)]
+        self.blobs.append(data)
+        self.size = align(self.size + len(data))
+        return ref
+
+
+    def write(self, filename, contents):
+        toc = json.dumps(contents).encode('utf-8')
+        header = HEADER.pack(MAGIC, VERSION, len(toc))
+        data_start = align(HEADER.size + len(toc))
+        # write to a temporary file first so a running game never sees
+        # a half written bundle
+        temp = filename + '.tmp'
+        with open(temp, 'wb') as f:
+            f.write(header)
+            f.write(toc)
+            f.write(bytes(data_start - HEADER.size - len(toc)))
+            for blob in self.blobs:
+                f.write(blob)
+                f.write(bytes(align(len(blob)) - len(blob)))
+        os.replace(temp, filename)
+
+
+
+class Bundle():
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.version, toc_len = HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{filename} is not an asset bundle')
+
+        toc_end = HEADER.size + toc_len
+        self.contents = json.loads(self.mmap[HEADER.size:toc_end].decode('utf-8'))
+        self.data_start = align(toc_end)
+        self.view = memoryview(self.mmap)
+
+
+    def blob(self, ref):
+        '''returns a memoryview of the blob without copying it'''
+        offset, length = ref
+        start = self.data_start + offset
+        return self.view[start:start + length]
+
+
+    def is_up_to_date(self, base_dir):
+        '''checks the bundle against the modification times of its sources'''
+        if self.version != VERSION:
+            return False
+        for f, mtime in self.contents['sources'].items():
+            path = os.path.join(base_dir, f)
+            if not os.path.exists(path) or os.path.getmtime(path) != mtime:
+                return False
+        return True
+
+
+    def has_map(self, key):
+        return key in self.contents['maps']
+
+
+    def load_map(self, key):
+        '''
+        returns the same map data structure as tilemaps.load_tmx()
+        tile images are converted to the display format, so this has
+        to be called after the display is initialised
+        '''
+        entry = self.contents['maps'][key]
+        pixels = self.blob(entry['pixels'])
+
+        tile_images = [None] * entry['gid_count']
+        for gid, w, h, start in entry['tiles']:
+            buffer = pixels[start:start + w * h * 4]
+            tile_images[gid] = pg.image.frombuffer(buffer, (w, h), 'RGBA').convert_alpha()
+
+        layers = []
+        for layer in entry['layers']:
+            layer = dict(layer)
+            if layer['type'] == 'tiles':
+                layer['data'] = self.blob(layer['data']).cast('I')
+            layers.append(layer)
+
+        map_data = dict(entry)
+        map_data['tile_images'] = tile_images
+        map_data['layers'] = layers
+        return map_data
+
+
+    def has_text(self, key):
+        return key in self.contents['texts']
+
+
+    def load_text(self, key):
+        return self.contents['texts'][key]
\ No newline at end of file
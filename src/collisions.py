@@ -0,0 +1,105 @@
+'''
+Collision manager
+
+Finds the collisions between the hitboxes of all sprites in the
+game.colliders group once per frame, with a spatial hash instead of
+testing every sprite against every other sprite.
+
+A collider has the class attributes
+    collision_layer: the layer it is on (one of the layer bits below)
+    collision_mask: the layers it collides with (layer bits combined with |)
+and, if its mask is not 0, the callback
+    on_collision(other): called once per frame for every sprite on a masked
+                         layer whose hitbox overlaps its own hitbox
+
+The mask says who reacts: a weapon with the mask ENEMY is told about the
+enemies it hits, the enemies don't have to know about weapons.
+'''
+
+# collision layers
+PLAYER = 1
+ENEMY = 2
+WEAPON = 4
+PICKUP = 8
+
+LAYERS = (PLAYER, ENEMY, WEAPON, PICKUP)
+# layers with up to this many sprites are not put into the spatial hash
+SMALL_LAYER = 4
+
+
+
+class CollisionManager():
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        # (layer, cell x, cell y): sprites whose hitboxes overlap the cell
+        self.cells = {}
+        # number of hitbox pairs that were tested in the last update
+        self.tests = 0
+
+
+    def cells_of(self, rect):
+        size = self.cell_size
+        return [(x, y) for x in range(rect.left // size,
+                                      (rect.right - 1) // size + 1)
+                       for y in range(rect.top // size,
+                                      (rect.bottom - 1) // size + 1)]
+
+
+    def update(self, sprites):
+        '''finds the collisions of the sprites and calls their callbacks'''
+        # callbacks can kill sprites, which removes them from their groups
+        sprites = list(sprites)
+        # only the layers that are in a mask are looked at
+        masked = 0
+        for sprite in sprites:
+            masked |= sprite.collision_mask
+        layer_sprites = {}
+        for sprite in sprites:
+            layer = sprite.collision_layer
+            if layer & masked:
+                layer_sprites.setdefault(layer, []).append(sprite)
+
+        # layers with only a few sprites (like the player) are tested
+        # directly, the others are put into the hash
+        cells = self.cells = {}
+        cells_of = self.cells_of
+        for layer, members in layer_sprites.items():
+            if len(members) <= SMALL_LAYER:
+                continue
+            for sprite in members:
+                for x, y in cells_of(sprite.hitbox):
+                    key = (layer, x, y)
+                    if key in cells:
+                        cells[key].append(sprite)
+                    else:
+                        cells[key] = [sprite]
+
+        self.tests = 0
+        get = cells.get
+        for sprite in sprites:
+            mask = sprite.collision_mask
+            if not mask or not sprite.alive():
+                continue
+            hitbox = sprite.hitbox
+            hits = []
+            sprite_cells = None
+            for layer in LAYERS:
+                members = layer_sprites.get(layer) if layer & mask else None
+                if not members:
+                    continue
+                if len(members) <= SMALL_LAYER:
+                    candidates = members
+                else:
+                    if sprite_cells is None:
+                        sprite_cells = cells_of(hitbox)
+                    candidates = [other for x, y in sprite_cells
+                                  for other in get((layer, x, y), ())]
+                for other in candidates:
+                    if other is sprite or other in hits:
+                        continue
+                    self.tests += 1
+                    if hitbox.colliderect(other.hitbox):
+                        hits.append(other)
+            for other in hits:
+                if sprite.alive() and other.alive():
+                    sprite.on_collision(other)
\ No newline at end of file
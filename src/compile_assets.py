@@ -0,0 +1,112 @@
+import os
+# compiling doesn't need a window
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame as pg
+import glob
+import json
+import xml.etree.ElementTree as ET
+
+from bundle import BundleWriter, bundle_key
+import tilemaps
+import utilities as utils
+
+
+'''
+Compiles all Tiled maps in data/tilemaps and all texts in data/text into
+data/assets.bundle (see bundle.py for the file layout).
+The game loads maps and texts from the bundle instead of parsing the source
+files as long as none of the sources changed after compiling.
+
+Run this from the src directory:
+    python compile_assets.py
+'''
+
+
+def map_sources(filename):
+    '''returns the map file and all tileset files and images it depends on'''
+    sources = [filename]
+    folder = os.path.dirname(filename)
+    for tileset in ET.parse(filename).getroot().iter('tileset'):
+        tsx = tileset.get('source')
+        if tsx:
+            tsx = os.path.join(folder, tsx)
+            sources.append(tsx)
+            tileset = ET.parse(tsx).getroot()
+            image_folder = os.path.dirname(tsx)
+        else:
+            image_folder = folder
+        for image in tileset.iter('image'):
+            sources.append(os.path.join(image_folder, image.get('source')))
+    return sources
+
+
+def compile_map(writer, filename):
+    map_data = tilemaps.load_tmx(filename)
+
+    # store all tile images in one blob of raw RGBA pixels
+    tiles = []
+    pixels = bytearray()
+    for gid, image in enumerate(map_data['tile_images']):
+        if image is not None:
+            w, h = image.get_size()
+            tiles.append([gid, w, h, len(pixels)])
+            # opaque tiles have no alpha channel to export
+            pixels += pg.image.tostring(image.convert_alpha(), 'RGBA')
+
+    layers = []
+    for layer in map_data['layers']:
+        layer = dict(layer)
+        if layer['type'] == 'tiles':
+            layer['data'] = writer.add_blob(layer['data'].tobytes())
+        else:
+            # drop references to pytmx objects
+            layer['objects'] = [{key: value for key, value in obj.items()
+                                 if utils.is_jsonable(value)}
+                                for obj in layer['objects']]
+        layers.append(layer)
+
+    entry = {key: map_data[key] for key in ['width', 'height', 'tilewidth',
+                                            'tileheight', 'background_color',
+                                            'animations']}
+    entry['gid_count'] = len(map_data['tile_images'])
+    entry['tiles'] = tiles
+    entry['pixels'] = writer.add_blob(pixels)
+    entry['layers'] = layers
+    return entry
+
+
+def compile_assets(base_dir):
+    pg.display.init()
+    # pytmx converts the tile images, which needs a display surface
+    pg.display.set_mode((1, 1))
+
+    writer = BundleWriter()
+    sources = []
+    contents = {'maps': {}, 'texts': {}}
+
+    map_files = sorted(glob.glob(os.path.join(base_dir, 'data', 'tilemaps', '*.tmx')))
+    for filename in map_files:
+        key = bundle_key(base_dir, filename)
+        contents['maps'][key] = compile_map(writer, filename)
+        sources += map_sources(filename)
+        print(f'Compiled {key}')
+
+    text_files = sorted(glob.glob(os.path.join(base_dir, 'data', 'text', '*.json')))
+    for filename in text_files:
+        key = bundle_key(base_dir, filename)
+        with open(filename) as f:
+            contents['texts'][key] = json.load(f)
+        sources.append(filename)
+
+    contents['sources'] = {bundle_key(base_dir, f): os.path.getmtime(f)
+                           for f in sources}
+
+    filename = os.path.join(base_dir, 'data', 'assets.bundle')
+    writer.write(filename, contents)
+    print(f'Wrote {filename} ({os.path.getsize(filename) // 1024} KB)')
+    pg.quit()
+
+
+if __name__ == '__main__':
+    compile_assets(os.path.join(os.path.dirname(__file__), '..'))
\ No newline at end of file
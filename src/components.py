@@ -0,0 +1,362 @@
+import pygame as pg
+from array import array
+import math
+
+import utilities as utils
+
+vec = pg.math.Vector2
+
+# directions (same as in sprites.py)
+RIGHT, DOWN, LEFT, UP = range(4)
+
+
+'''
+Component store
+
+Keeps the movement and animation data of many sprites in parallel arrays
+(one slot per sprite) and updates them in bulk with systems, instead of
+every sprite moving, colliding and animating itself in its state machine.
+
+Sprite classes opt in by inheriting from ComponentSprite. Their pos, vel,
+acc and animation attributes are views of their slot, so the rest of the
+code (states, saves, drawing) uses them like before. Their states only
+decide where to go (by setting acc) and the systems do the rest once per
+frame (see ComponentStore.update):
+    movement:   forces, acceleration, friction, position and direction
+    walls:      pushes the hitboxes out of the walls, found through a grid
+                of cells instead of testing every wall. Sprites that move
+                more than half their hitbox in a frame are swept against 
+                the walls first (see move_swept), so they can't pass 
+                through them at low frame rates
+    animation:  advances the animation timers, only sprites whose frame
+                changes are called (advance_frame)
+
+Walls are static hitboxes in the store (add_wall/remove_wall).
+'''
+
+
+class ComponentStore():
+    # float components
+    FLOATS = ('pos_x', 'pos_y', 'vel_x', 'vel_y', 'acc_x', 'acc_y',
+              'force_x', 'force_y', 'speed', 'friction',
+              'anim_timer', 'anim_delay')
+    # integer components
+    INTS = ('anim_frame', 'lastdir', 'moving')
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.sprites = []
+        self.clear()
+
+
+    def __len__(self):
+        return len(self.sprites) - len(self.free)
+
+
+    def add(self, sprite):
+        '''returns a new slot for the sprite, with all components zeroed'''
+        if self.free:
+            slot = self.free.pop()
+            self.sprites[slot] = sprite
+            for name in self.FLOATS + self.INTS:
+                getattr(self, name)[slot] = 0
+        else:
+            slot = len(self.sprites)
+            self.sprites.append(sprite)
+            for name in self.FLOATS + self.INTS:
+                getattr(self, name).append(0)
+        return slot
+
+
+    def remove(self, slot):
+        self.sprites[slot] = None
+        self.free.append(slot)
+
+
+    def clear(self):
+        '''removes all sprites and walls'''
+        for sprite in self.sprites:
+            if sprite is not None:
+                sprite.slot = None
+        for name in self.FLOATS:
+            setattr(self, name, array('d'))
+        for name in self.INTS:
+            setattr(self, name, array('i'))
+        # slot: sprite (None for free slots)
+        self.sprites = []
+        self.free = []
+        # (cell x, cell y): list of walls that overlap the cell
+        self.wall_cells = {}
+
+
+    def wall_cells_of(self, rect):
+        size = self.cell_size
+        return [(x, y) for x in range(rect.left // size,
+                                      (rect.right - 1) // size + 1)
+                       for y in range(rect.top // size,
+                                      (rect.bottom - 1) // size + 1)]
+
+
+    def add_wall(self, wall):
+        for cell in self.wall_cells_of(wall.hitbox):
+            self.wall_cells.setdefault(cell, []).append(wall)
+
+
+    def remove_wall(self, wall):
+        for cell in self.wall_cells_of(wall.hitbox):
+            walls = self.wall_cells.get(cell)
+            if walls and wall in walls:
+                walls.remove(wall)
+                if not walls:
+                    del self.wall_cells[cell]
+
+
+    def wall_at(self, rect):
+        '''returns a wall that collides with the rect, or None'''
+        cells = self.wall_cells
+        size = self.cell_size
+        for x in range(rect.left // size, (rect.right - 1) // size + 1):
+            for y in range(rect.top // size, (rect.bottom - 1) // size + 1):
+                for wall in cells.get((x, y), ()):
+                    if rect.colliderect(wall.hitbox):
+                        return wall
+        return None
+
+
+    def sweep(self, x, y, w, h, dx, dy):
+        '''
+        returns the first wall hit by a box (x, y: top left, w, h) that 
+        moves by (dx, dy) as (time of impact, normal x, normal y, wall), 
+        or None (see utilities.swept_aabb)
+        '''
+        size = self.cell_size
+        # the cells of the area that the box moves through
+        left = int(min(x, x + dx)) // size
+        right = int(max(x, x + dx) + w) // size
+        top = int(min(y, y + dy)) // size
+        bottom = int(max(y, y + dy) + h) // size
+        first = None
+        tested = set()
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                for wall in self.wall_cells.get((cx, cy), ()):
+                    if wall in tested:
+                        continue
+                    tested.add(wall)
+                    hit = utils.swept_aabb(x, y, w, h, dx, dy, wall.hitbox)
+                    if hit and (first is None or hit[0] < first[0]):
+                        first = hit + (wall,)
+        return first
+
+
+    def move_swept(self, cx, cy, w, h, dx, dy):
+        '''
+        moves a box (cx, cy: center, w, h) by (dx, dy) and stops it at the
+        walls, the rest of the movement slides along the wall
+        returns the new center and if the x and y movement was blocked
+        '''
+        blocked_x = blocked_y = False
+        # a second sweep for sliding into a corner
+        for _ in range(2):
+            hit = self.sweep(cx - w / 2, cy - h / 2, w, h, dx, dy)
+            if hit is None:
+                return cx + dx, cy + dy, blocked_x, blocked_y
+            time, nx, ny, wall = hit
+            cx += dx * time
+            cy += dy * time
+            if nx:
+                blocked_x = True
+                dx = 0
+                dy *= 1 - time
+            else:
+                blocked_y = True
+                dy = 0
+                dx *= 1 - time
+        return cx, cy, blocked_x, blocked_y
+
+
+    def update(self, dt):
+        movement_system(self, dt)
+        wall_system(self)
+        animation_system(self, dt)
+
+
+
+def movement_system(store, dt):
+    '''moves the sprites like BaseSprite physics (see Enemy in sprites.py)'''
+    pos_x, pos_y = store.pos_x, store.pos_y
+    vel_x, vel_y = store.vel_x, store.vel_y
+    acc_x, acc_y = store.acc_x, store.acc_y
+    force_x, force_y = store.force_x, store.force_y
+    speed, friction = store.speed, store.friction
+    moving, lastdir = store.moving, store.lastdir
+    hypot = math.hypot
+    for i, sprite in enumerate(store.sprites):
+        if sprite is None:
+            continue
+        ax = acc_x[i]
+        ay = acc_y[i]
+        length = hypot(ax, ay)
+        if length > 1:
+            # prevent faster diagnoal movement
+            ax /= length
+            ay /= length
+        # apply additional forces once
+        ax += force_x[i]
+        ay += force_y[i]
+        force_x[i] = force_y[i] = acc_x[i] = acc_y[i] = 0
+
+        s = speed[i] * dt
+        vx = (vel_x[i] + ax * s) * friction[i]
+        vy = (vel_y[i] + ay * s) * friction[i]
+        if hypot(vx, vy) < 0.1:
+            vx = vy = 0
+            moving[i] = 0
+        else:
+            moving[i] = 1
+            if ax > 0:
+                lastdir[i] = RIGHT
+            elif ax < 0:
+                lastdir[i] = LEFT
+            if ay > 0:
+                lastdir[i] = DOWN
+            elif ay < 0:
+                lastdir[i] = UP
+        vel_x[i] = vx
+        vel_y[i] = vy
+        pos_x[i] += vx
+        pos_y[i] += vy
+
+
+def wall_system(store):
+    '''
+    moves the hitboxes to the positions and out of the walls, one axis
+    after the other (like utilities.collide_with_walls)
+    '''
+    pos_x, pos_y = store.pos_x, store.pos_y
+    vel_x, vel_y = store.vel_x, store.vel_y
+    wall_at = store.wall_at
+    for i, sprite in enumerate(store.sprites):
+        if sprite is None:
+            continue
+        hitbox = sprite.hitbox
+        # the velocity is the movement of this frame
+        vx = vel_x[i]
+        vy = vel_y[i]
+        if abs(vx) > hitbox.w / 2 or abs(vy) > hitbox.h / 2:
+            x, y, blocked_x, blocked_y = store.move_swept(
+                    pos_x[i] - vx, pos_y[i] - vy, hitbox.w, hitbox.h, vx, vy)
+            pos_x[i] = x
+            pos_y[i] = y
+            if blocked_x:
+                vel_x[i] = 0
+            if blocked_y:
+                vel_y[i] = 0
+        
+        hitbox.centerx = pos_x[i]
+        wall = wall_at(hitbox)
+        if wall:
+            if wall.hitbox.centerx > hitbox.centerx:
+                pos_x[i] = wall.hitbox.left - hitbox.w / 2
+            elif wall.hitbox.centerx < hitbox.centerx:
+                pos_x[i] = wall.hitbox.right + hitbox.w / 2
+            vel_x[i] = 0
+            hitbox.centerx = pos_x[i]
+
+        hitbox.centery = pos_y[i]
+        wall = wall_at(hitbox)
+        if wall:
+            if wall.hitbox.centery > hitbox.centery:
+                pos_y[i] = wall.hitbox.top - hitbox.h / 2
+            elif wall.hitbox.centery < hitbox.centery:
+                pos_y[i] = wall.hitbox.bottom + hitbox.h / 2
+            vel_y[i] = 0
+            hitbox.centery = pos_y[i]
+        # the image is drawn with its bottom at the hitbox's bottom
+        sprite.rect.midbottom = hitbox.midbottom
+
+
+def animation_system(store, dt):
+    '''advances the animation timers, sprites change their frame when it runs out'''
+    timers, delays = store.anim_timer, store.anim_delay
+    for i, sprite in enumerate(store.sprites):
+        if sprite is None:
+            continue
+        timer = timers[i] + dt
+        if timer >= delays[i]:
+            timer -= delays[i]
+            timers[i] = timer
+            sprite.advance_frame()
+        else:
+            timers[i] = timer
+
+
+
+def component(name):
+    '''a sprite attribute that is stored in the sprite's slot'''
+    def get(self):
+        return getattr(self.game.components, name)[self.slot]
+
+    def set_(self, value):
+        getattr(self.game.components, name)[self.slot] = value
+    return property(get, set_)
+
+
+def vec_component(name_x, name_y):
+    '''
+    a vector sprite attribute that is stored in two components
+    it returns a copy, changing it in place (v.x = 1) has no effect
+    '''
+    def get(self):
+        store = self.game.components
+        return vec(getattr(store, name_x)[self.slot],
+                   getattr(store, name_y)[self.slot])
+
+    def set_(self, value):
+        store = self.game.components
+        getattr(store, name_x)[self.slot] = value[0]
+        getattr(store, name_y)[self.slot] = value[1]
+    return property(get, set_)
+
+
+
+class ComponentSprite():
+    '''
+    mixin for BaseSprite subclasses that are updated by the systems of
+    game.components. It gets a slot when it is set up and frees it when
+    it is killed
+    '''
+    slot = None
+
+    pos = vec_component('pos_x', 'pos_y')
+    vel = vec_component('vel_x', 'vel_y')
+    acc = vec_component('acc_x', 'acc_y')
+    speed = component('speed')
+    friction = component('friction')
+    anim_timer = component('anim_timer')
+    anim_delay = component('anim_delay')
+    anim_frame = component('anim_frame')
+    lastdir = component('lastdir')
+
+    def setup(self, kwargs):
+        if self.slot is None:
+            self.slot = self.game.components.add(self)
+        super().setup(kwargs)
+
+
+    def kill(self):
+        if self.slot is not None:
+            self.game.components.remove(self.slot)
+            self.slot = None
+        super().kill()
+
+
+    def add_force(self, vector):
+        store = self.game.components
+        store.force_x[self.slot] += vector[0]
+        store.force_y[self.slot] += vector[1]
+
+
+    @property
+    def moving(self):
+        return bool(self.game.components.moving[self.slot])
\ No newline at end of file
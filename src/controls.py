@@ -1,12 +1,37 @@
 import pygame as pg
 import traceback
+from array import array
+from collections.abc import Mapping
 
 
 # TODO move Button mapping to settings?
 
+
+class InputView(Mapping):
+    '''
+    read only dict-like view of an input state array by action name
+    like game.keys_pressed['A']
+    '''
+    def __init__(self, state, action_index):
+        self.state = state
+        self.action_index = action_index
+
+    def __getitem__(self, action):
+        return self.state[self.action_index[action]]
+
+    def __iter__(self):
+        return iter(self.action_index)
+
+    def __len__(self):
+        return len(self.action_index)
+
+
+
 class KeyGetter:
-    def __init__(self, game):
+    def __init__(self, game, pad_index=0):
         self.game = game
+        # the gamepad this KeyGetter reads (for more than one player)
+        self.pad_index = pad_index
         # mapping is a dict with 'name': pg.Key
         # default settings:
         self.keyboard_mapping = {
@@ -23,49 +48,114 @@ class KeyGetter:
                 'START': pg.K_RETURN,
                 'SELECT': pg.K_BACKSPACE
                 }
+        
+        self.actions = list(self.keyboard_mapping)
+        self.action_index = {action: i for i, action in enumerate(self.actions)}
+        
+        # input states, one entry per action
+        self.empty_state = array('B', bytes(len(self.actions)))
+        self.pressed = array('B', self.empty_state)
+        self.down = array('B', self.empty_state)
+        self.up = array('B', self.empty_state)
+        # number of keys held down per action (keyboard only)
+        self.held = array('B', self.empty_state)
+        self.held_keys = set()
+        
+        # the game reads the input states through these views
+        self.game.keys_pressed = InputView(self.pressed, self.action_index)
+        self.game.keydown = InputView(self.down, self.action_index)
+        self.game.keyup = InputView(self.up, self.action_index)
+        
+        self.build_lookup_tables()
+    
+    
+    def build_lookup_tables(self):
+        '''
+        precomputes the keycode: actions table and the list of 
+        (action, gamepad input) pairs, so get_input doesn't search the mappings
+        '''
+        self.key_actions = {}
+        for action, keys in self.keyboard_mapping.items():
+            if isinstance(keys, int):
+                keys = [keys]
+            for key in keys:
+                self.key_actions.setdefault(key, []).append(self.action_index[action])
+        
+        button_mapping = self.game.gamepad_controller.button_mapping
+        self.pad_buttons = [(i, button_mapping[action]) 
+                            for i, action in enumerate(self.actions)
+                            if action in button_mapping]
+        
+        # keys that are held down keep counting for their new actions
+        self.held[:] = self.empty_state
+        for key in self.held_keys:
+            for i in self.key_actions.get(key, ()):
+                self.held[i] += 1
+    
+    
+    def rebind(self, action, *keys):
+        '''
+        assigns one or more keys to an action at runtime
+        Args:
+            action: action name like 'A'
+            keys: pygame key codes like pg.K_SPACE
+        '''
+        self.keyboard_mapping[action] = keys[0] if len(keys) == 1 else list(keys)
+        self.build_lookup_tables()
 
 
     def get_input(self, pad, events):
         '''
         Processes the inputs from a gamepad and the keyboard and combines them
-        into dictionaries as properties of the game object
+        into the input states that game.keys_pressed, game.keydown and 
+        game.keyup are views of
         Args:
             pad: GamepadController instance
             events: event list from pygame.event.get()
         '''
-        
-        # process key status
-        # create empty dict with key status
-        self.game.keys_pressed = {key: 0 for key in self.keyboard_mapping.keys()}
-        
-        key_presses = pg.key.get_pressed()
-        for key, value in self.keyboard_mapping.items():
-            if not pad.inputs:
-                if key_presses[value]:
-                    self.game.keys_pressed[key] = 1
-            else:
-                if (pad.inputs[0][pad.button_mapping[key]] or 
-                    key_presses[value]):
-                    self.game.keys_pressed[key] = 1
+        down = self.down
+        up = self.up
+        held = self.held
+        down[:] = self.empty_state
+        up[:] = self.empty_state
         
         # process keydown and keyup events
-        self.game.keydown = {key: 0 for key in self.keyboard_mapping.keys()}
-        self.game.keyup = {key: 0 for key in self.keyboard_mapping.keys()}  
         for event in events:
             if event.type == pg.KEYDOWN:
-                for key, value in self.keyboard_mapping.items():
-                    if event.key == value:
-                        self.game.keydown[key] = 1
+                if event.key in self.key_actions and event.key not in self.held_keys:
+                    self.held_keys.add(event.key)
+                    for i in self.key_actions[event.key]:
+                        held[i] += 1
+                        down[i] = 1
             elif event.type == pg.KEYUP:
-                for key, value in self.keyboard_mapping.items():
-                    if event.key == value:
-                        self.game.keyup[key] = 1
-                        
-        for key, value in pad.button_mapping.items():
-            if pad.inputs_down and pad.inputs_down[0][value]:
-                self.game.keydown[key] = 1
-            elif pad.inputs_up and pad.inputs_up[0][value]:
-                self.game.keyup[key] = 1
+                if event.key in self.held_keys:
+                    self.held_keys.discard(event.key)
+                    # the key might have been unbound while it was held
+                    for i in self.key_actions.get(event.key, ()):
+                        held[i] -= 1
+                        up[i] = 1
+            elif event.type == pg.WINDOWFOCUSLOST:
+                # key releases are not sent to an unfocused window
+                self.held_keys.clear()
+                held[:] = self.empty_state
+        
+        # process key status
+        pressed = self.pressed
+        for i in range(len(pressed)):
+            pressed[i] = held[i] > 0
+        
+        # add the gamepad inputs
+        if len(pad.inputs) > self.pad_index:
+            inputs = pad.inputs[self.pad_index]
+            inputs_down = pad.inputs_down[self.pad_index]
+            inputs_up = pad.inputs_up[self.pad_index]
+            for i, button in self.pad_buttons:
+                if inputs[button]:
+                    pressed[i] = 1
+                if inputs_down[button]:
+                    down[i] = 1
+                elif inputs_up[button]:
+                    up[i] = 1
                   
     
     def test_inputs(self, inputs):
@@ -79,7 +169,7 @@ class KeyGetter:
         try:
             for key, value in inputs.items():
                 if value:
-                    input_string += pg.key.name(key)
+                    input_string += key
                     input_string += ','
             if input_string:
                 print(input_string)
@@ -87,21 +177,29 @@ class KeyGetter:
             traceback.print_exc()
 
 
-def listen_for_gamepads():
-    # re-initialize joystick to look for pads plugged in at runtime
-    pg.joystick.init()
+# number of entries in the input state of a gamepad (see button_mapping)
+NUM_INPUTS = 22
+# buttons with a higher index (like the guide button) are ignored
+NUM_BUTTONS = 10
 
 
 class GamepadController:
+    '''
+    keeps the input state of all gamepads, updated from the joystick events
+    of the current frame. Gamepads can be plugged in and out at runtime.
+    '''
     def __init__(self):
-        self.gamepads = []
-        # buttons held down
+        # joystick objects by their instance id, in the order they were added
+        self.gamepads = {}
+        # instance id: index of the gamepad in the input lists
+        self.pad_index = {}
+        # buttons held down, one array with NUM_INPUTS values per gamepad
         self.inputs = []
         # button press events
         self.inputs_down = []
         self.inputs_up = []
-        self.inputs_down_prev = []
-        self.inputs_up_prev = []
+        # indices of the gamepads with press or release events last frame
+        self.changed = set()
         
         self.deadzones = {
                 'stick_l': 0.2,
@@ -134,7 +232,11 @@ class GamepadController:
                     'LEFT': 20,
                     'UP': 21,
                     }
+        
+        self.empty_input = array('f', bytes(4 * NUM_INPUTS))
 
+        # pygame sends a JOYDEVICEADDED event for every gamepad that is
+        # already plugged in
         pg.joystick.init()
         
     
@@ -158,88 +260,114 @@ class GamepadController:
         '''returns if any of the buttons from any gamepad is pressed at this frame
         '''
         return any([any(i) for i in self.inputs])
+    
+    
+    def add_gamepad(self, device_index):
+        pad = pg.joystick.Joystick(device_index)
+        pad.init()
+        self.pad_index[pad.get_instance_id()] = len(self.gamepads)
+        self.gamepads[pad.get_instance_id()] = pad
+        self.inputs.append(array('f', self.empty_input))
+        self.inputs_down.append(array('f', self.empty_input))
+        self.inputs_up.append(array('f', self.empty_input))
+        print(f'Gamepad connected: {pad.get_name()}')
+    
+    
+    def remove_gamepad(self, instance_id):
+        if instance_id not in self.gamepads:
+            return
+        n = self.pad_index[instance_id]
+        pad = self.gamepads.pop(instance_id)
+        del self.inputs[n]
+        del self.inputs_down[n]
+        del self.inputs_up[n]
+        self.pad_index = {id_: i for i, id_ in enumerate(self.gamepads)}
+        # the indices of the remaining pads changed, so reset all events
+        for n in range(len(self.inputs)):
+            self.inputs_down[n][:] = self.empty_input
+            self.inputs_up[n][:] = self.empty_input
+        self.changed.clear()
+        print(f'Gamepad disconnected: {pad.get_name()}')
+    
+    
+    def set_input(self, n, i, value):
+        # save press and release events by comparing to the current state
+        current = self.inputs[n][i]
+        if value and not current:
+            self.inputs_down[n][i] = 1
+            self.changed.add(n)
+        elif current and not value:
+            self.inputs_up[n][i] = 1
+            self.changed.add(n)
+        self.inputs[n][i] = value
+    
+    
+    def set_axis(self, n, axis, value):
+        # compare each axis to deadzone
+        if axis == 0:
+            # X axis left stick
+            self.set_input(n, 12, value if abs(value) > self.deadzones['stick_l'] else 0)
+        elif axis == 1:
+            # Y axis left stick
+            self.set_input(n, 13, value if abs(value) > self.deadzones['stick_l'] else 0)
+        elif axis == 2:
+            if value > self.deadzones['trigger_l']:
+                self.set_input(n, 16, value)
+                self.set_input(n, 17, 0)
+            elif abs(value) > self.deadzones['trigger_r']:
+                self.set_input(n, 17, abs(value))
+                self.set_input(n, 16, 0)
+            else:
+                self.set_input(n, 16, 0)
+                self.set_input(n, 17, 0)
+        elif axis == 3:
+            # y axis right stick
+            self.set_input(n, 15, value if abs(value) > self.deadzones['stick_r'] else 0)
+        elif axis == 4:
+            # X axis right stick
+            self.set_input(n, 14, value if abs(value) > self.deadzones['stick_r'] else 0)
+    
+    
+    def set_hat(self, n, value):
+        X, Y = value
+        self.set_input(n, 10, X)
+        self.set_input(n, 11, Y)
+        self.set_input(n, 18, 1 if X > 0 else 0)
+        self.set_input(n, 19, 1 if Y < 0 else 0)
+        self.set_input(n, 20, 1 if X < 0 else 0)
+        self.set_input(n, 21, 1 if Y > 0 else 0)
 
-    def update(self):
-        listen_for_gamepads()
 
-        self.gamepads = [pg.joystick.Joystick(x) for x in range(
-                         pg.joystick.get_count())]
-    
-        self.inputs = []
-        self.inputs_down = []
-        self.inputs_up = []
+    def update(self, events):
+        '''
+        Processes the joystick events of this frame
+        Args:
+            events: event list from pygame.event.get()
+        '''
+        # press and release events only last one frame
+        for n in self.changed:
+            self.inputs_down[n][:] = self.empty_input
+            self.inputs_up[n][:] = self.empty_input
+        self.changed.clear()
         
-        if len(self.gamepads) > 0:
-            for n, pad in enumerate(self.gamepads):
-                self.inputs.append([0 for i in range(len(self.button_mapping))])
-                pad.init()
-                
-                # get button values
-                for i in range(pad.get_numbuttons()):
-                    if pad.get_button(i):
-                        self.inputs[n][i] = 1
-                            
-                # get axes values
-                for i in range(pad.get_numaxes()):
-                    axis = pad.get_axis(i)
-                    # compare each axis to deadzone
-                    if i == 0:
-                        # X axis left stick
-                        if abs(axis) > self.deadzones['stick_l']:
-                            self.inputs[n][12] = axis
-                    elif i == 1:
-                        # Y axis left stick
-                        if abs(axis) > self.deadzones['stick_l']:
-                            self.inputs[n][13] = axis
-                    elif i == 2:
-                        if axis > self.deadzones['trigger_l']:
-                            self.inputs[n][16] = axis
-                            self.inputs[n][17] = 0
-                        elif abs(axis) > self.deadzones['trigger_r']:
-                            self.inputs[n][17] = abs(axis)
-                            self.inputs[n][16] = 0
-                    elif i == 3:
-                        # y axis right stick
-                        if abs(axis) > self.deadzones['stick_r']:
-                            self.inputs[n][15] = axis
-                    elif i == 4:
-                        # X axis right stick
-                        if abs(axis) > self.deadzones['stick_r']:
-                            self.inputs[n][14] = axis
-                        
-                # get dpad values
-                for i in range(pad.get_numhats()):
-                    self.inputs[n][10], self.inputs[n][11] = pad.get_hat(i)
-                    X = self.inputs[n][10]
-                    Y = self.inputs[n][11]
-                    self.inputs[n][18] = 1 if X > 0 else 0
-                    self.inputs[n][19] = 1 if Y < 0 else 0
-                    self.inputs[n][20] = 1 if X < 0 else 0
-                    self.inputs[n][21] = 1 if Y > 0 else 0
-                
-                # save button_pressed events by comparing to previous presses
-                if len(self.inputs_down_prev) == n:
-                    # if this gamepad has no previous inputs
-                    self.inputs_down_prev.append([0 for _ in self.inputs[n]])
-                else:
-                    # compare current input to prev input
-                    diff = [1 if elem and not self.inputs_down_prev[n][i] 
-                            else 0 for i, elem in enumerate(self.inputs[n])]
-                    self.inputs_down.append(diff)
-                    # set prev input to current input
-                    self.inputs_down_prev[n] = [inp for inp in self.inputs[n]]
-                
-                # do the same for release events
-                if len(self.inputs_up_prev) == n:
-                    # if this gamepad has no previous inputs
-                    self.inputs_up_prev.append([0 for _ in self.inputs[n]])
-                else:
-                    # compare current input to prev input
-                    diff = [1 if not elem and self.inputs_up_prev[n][i] 
-                            else 0 for i, elem in enumerate(self.inputs[n])]
-                    self.inputs_up.append(diff)
-                    # set prev input to current input
-                    self.inputs_up_prev[n] = [inp for inp in self.inputs[n]]  
-
-
-                    
+        for event in events:
+            if event.type == pg.JOYDEVICEADDED:
+                self.add_gamepad(event.device_index)
+            elif event.type == pg.JOYDEVICEREMOVED:
+                self.remove_gamepad(event.instance_id)
+            elif event.type in (pg.JOYBUTTONDOWN, pg.JOYBUTTONUP,
+                                pg.JOYAXISMOTION, pg.JOYHATMOTION):
+                n = self.pad_index.get(event.instance_id)
+                if n is None:
+                    continue
+                if event.type == pg.JOYBUTTONDOWN:
+                    if event.button < NUM_BUTTONS:
+                        self.set_input(n, event.button, 1)
+                elif event.type == pg.JOYBUTTONUP:
+                    if event.button < NUM_BUTTONS:
+                        self.set_input(n, event.button, 0)
+                elif event.type == pg.JOYAXISMOTION:
+                    self.set_axis(n, event.axis, event.value)
+                elif event.type == pg.JOYHATMOTION:
+                    if event.hat == 0:
+                        self.set_hat(n, event.value)
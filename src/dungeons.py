@@ -0,0 +1,259 @@
+from array import array
+import os
+import random
+
+import settings as st
+import tilemaps
+
+
+'''
+Procedural dungeons
+
+A dungeon is a grid of rooms like the overworld grid, every room is one
+screen with walls around it and doors to its neighbours (the layout of
+data/tilemaps/sample_map2.tmx). The rooms are made as map data dicts in the
+structure of tilemaps.load_tmx, with a tile layer and an object layer with
+Wall and Enemy objects, so they become tilemaps.Map objects and spawn their
+sprites like maps made in Tiled.
+
+Everything is made from the seed: the layout from (seed, number of rooms)
+and every room from (seed, number of rooms, room position) and its doors.
+So the same seed always makes the same dungeon, and a single room can be
+made without the others. The DungeonGenerator caches the layouts, and the
+rooms as Maps in game.maps (the key of a room in saves is its virtual
+file name dungeons/<seed>_<rooms>/room_<x>_<y>).
+
+The further a room is from the start room (its depth), the more enemies
+it has. Saves store [seed, rooms] as the key of the dungeon's grid, so
+loading makes the same dungeon again.
+'''
+
+# room size in tiles
+ROOM_W = st.GAME_SCREEN_TILES_WIDE
+ROOM_H = st.GAME_SCREEN_TILES_HIGH
+# width of a door in tiles
+DOOR_SIZE = 2
+# the maximum number of pillars and enemies in a room
+MAX_PILLARS = 4
+MAX_ENEMIES = 6
+
+# directions (same as in sprites.py) and their movement in the grid
+RIGHT, DOWN, LEFT, UP = range(4)
+DIRECTIONS = ((1, 0), (0, 1), (-1, 0), (0, -1))
+
+# gids of the 'dungeon_tiles' tileset (assets/graphics/tilesets/dungeon_test.png)
+FLOOR = 21
+TOP_LEFT, TOP_RIGHT, BOTTOM_LEFT, BOTTOM_RIGHT = 1, 2, 11, 12
+TOP, BOTTOM, LEFT_WALL, RIGHT_WALL = 3, 13, 4, 14
+# the wall ends next to doors
+END_1, END_2, END_3, END_4 = 5, 6, 15, 16
+# a pillar is a block of 2x2 tiles
+PILLAR = ((TOP_LEFT, TOP_RIGHT), (BOTTOM_LEFT, BOTTOM_RIGHT))
+
+
+
+class DungeonLayout():
+    '''
+    the rooms of a dungeon
+        width, height: size of the grid in rooms
+        start: grid position of the start room
+        doors: grid position: door bits (1 << direction) of the room
+        depth: grid position: number of rooms to the start room
+    '''
+    def __init__(self, seed, rooms, width, height, start, doors, depth):
+        self.seed = seed
+        self.rooms = rooms
+        self.width = width
+        self.height = height
+        self.start = start
+        self.doors = doors
+        self.depth = depth
+
+
+
+def generate_layout(seed, rooms):
+    '''
+    places the rooms by adding them next to random rooms that are already
+    placed, with a door between them, so every room can be reached
+    '''
+    rng = random.Random(seed)
+    doors = {(0, 0): 0}
+    placed = [(0, 0)]
+    while len(placed) < rooms:
+        x, y = rng.choice(placed)
+        direction = rng.randrange(4)
+        dx, dy = DIRECTIONS[direction]
+        new = (x + dx, y + dy)
+        if new in doors:
+            continue
+        doors[(x, y)] |= 1 << direction
+        doors[new] = 1 << (direction + 2) % 4
+        placed.append(new)
+
+    # move the rooms to positive grid positions
+    min_x = min(x for x, _ in placed)
+    min_y = min(y for _, y in placed)
+    doors = {(x - min_x, y - min_y): bits for (x, y), bits in doors.items()}
+    start = (-min_x, -min_y)
+
+    # the number of doors from the start room to every room
+    depth = {start: 0}
+    queue = [start]
+    for x, y in queue:
+        for direction, (dx, dy) in enumerate(DIRECTIONS):
+            new = (x + dx, y + dy)
+            if doors[(x, y)] & 1 << direction and new not in depth:
+                depth[new] = depth[(x, y)] + 1
+                queue.append(new)
+
+    width = max(x for x, _ in doors) + 1
+    height = max(y for _, y in doors) + 1
+    return DungeonLayout(seed, rooms, width, height, start, doors, depth)
+
+
+def door_range(length):
+    '''the tiles of a door in the middle of a wall'''
+    first = (length - DOOR_SIZE) // 2
+    return range(first, first + DOOR_SIZE)
+
+
+def wall_object(id_, x, y, w, h):
+    '''a Tiled object dict for a wall, the arguments are in tiles'''
+    tw, th = st.TILE_WIDTH, st.TILE_HEIGHT
+    return {'id': id_, 'name': 'Wall', 'type': None, 'x': x * tw,
+            'y': y * th, 'width': w * tw, 'height': h * th, 'properties': {}}
+
+
+def room_data(layout, x, y, tile_images):
+    '''
+    returns the map data (see tilemaps.load_tmx) of the room at the grid
+    position of the layout
+    tile_images: the images of the tileset by gid
+    '''
+    rng = random.Random(f'{layout.seed}/{layout.rooms}/{x}/{y}')
+    doors = layout.doors[(x, y)]
+    tiles = [[FLOOR] * ROOM_W for _ in range(ROOM_H)]
+    objects = []
+
+    # the outer walls, with a gap for every door
+    h_doors = door_range(ROOM_W)
+    v_doors = door_range(ROOM_H)
+    for row, wall, door in ((0, TOP, UP), (ROOM_H - 1, BOTTOM, DOWN)):
+        tiles[row] = [wall] * ROOM_W
+        tiles[row][0] = TOP_LEFT if row == 0 else BOTTOM_LEFT
+        tiles[row][-1] = TOP_RIGHT if row == 0 else BOTTOM_RIGHT
+        if doors & 1 << door:
+            for col in h_doors:
+                tiles[row][col] = FLOOR
+            tiles[row][h_doors[0] - 1] = END_4 if row == 0 else END_2
+            tiles[row][h_doors[-1] + 1] = END_3 if row == 0 else END_1
+            objects.append(wall_object(len(objects) + 1, 0, row,
+                                       h_doors[0], 1))
+            objects.append(wall_object(len(objects) + 1, h_doors[-1] + 1,
+                                       row, ROOM_W - h_doors[-1] - 1, 1))
+        else:
+            objects.append(wall_object(len(objects) + 1, 0, row, ROOM_W, 1))
+
+    for col, wall, door in ((0, LEFT_WALL, LEFT), (ROOM_W - 1, RIGHT_WALL, RIGHT)):
+        for row in range(1, ROOM_H - 1):
+            tiles[row][col] = wall
+        if doors & 1 << door:
+            for row in v_doors:
+                tiles[row][col] = FLOOR
+            tiles[v_doors[0] - 1][col] = END_4 if col == 0 else END_3
+            tiles[v_doors[-1] + 1][col] = END_2 if col == 0 else END_1
+            objects.append(wall_object(len(objects) + 1, col, 1, 1,
+                                       v_doors[0] - 1))
+            objects.append(wall_object(len(objects) + 1, col,
+                                       v_doors[-1] + 1, 1,
+                                       ROOM_H - v_doors[-1] - 2))
+        else:
+            objects.append(wall_object(len(objects) + 1, col, 1, 1,
+                                       ROOM_H - 2))
+
+    # pillars and enemies stay out of the way between the doors (the
+    # middle row and column), so every door can be reached
+    free = {(col, row) for col in range(2, ROOM_W - 2)
+            for row in range(2, ROOM_H - 2)
+            if col not in h_doors and row not in v_doors}
+    depth = layout.depth[(x, y)]
+    if depth:
+        for _ in range(rng.randint(0, MAX_PILLARS)):
+            col, row = rng.choice(sorted(free))
+            block = {(col + i, row + j) for i in range(2) for j in range(2)}
+            if not block <= free:
+                continue
+            free -= block
+            for i, j in ((0, 0), (1, 0), (0, 1), (1, 1)):
+                tiles[row + j][col + i] = PILLAR[j][i]
+            objects.append(wall_object(len(objects) + 1, col, row, 2, 2))
+
+        enemies = min(rng.randint(depth // 3, depth // 2 + 1), MAX_ENEMIES)
+        for col, row in rng.sample(sorted(free), min(enemies, len(free))):
+            objects.append({'id': len(objects) + 1, 'name': 'Enemy',
+                            'type': None,
+                            'x': (col + 0.5) * st.TILE_WIDTH,
+                            'y': (row + 0.5) * st.TILE_HEIGHT,
+                            'width': st.TILE_WIDTH, 'height': st.TILE_HEIGHT,
+                            'properties': {}})
+
+    return {
+            'width': ROOM_W,
+            'height': ROOM_H,
+            'tilewidth': st.TILE_WIDTH,
+            'tileheight': st.TILE_HEIGHT,
+            'background_color': None,
+            'tile_images': tile_images,
+            # the player starts in the middle, between the doors
+            'properties': {'player_start': (ROOM_W * st.TILE_WIDTH // 2,
+                                            ROOM_H * st.TILE_HEIGHT // 2)},
+            'layers': [
+                    {'name': 'floor', 'visible': True, 'properties': {},
+                     'type': 'tiles',
+                     'data': array('I', [gid for row in tiles for gid in row])},
+                    {'name': 'sprites', 'visible': True, 'properties': {},
+                     'type': 'objects', 'objects': objects}
+                    ],
+            'animations': []
+            }
+
+
+
+class DungeonGenerator():
+    def __init__(self, game):
+        self.game = game
+        # (seed, rooms): DungeonLayout
+        self.layouts = {}
+        # the tileset images by gid, 0 is empty
+        self.tile_images = None
+
+
+    def get_layout(self, seed, rooms):
+        key = (seed, rooms)
+        if key not in self.layouts:
+            self.layouts[key] = generate_layout(seed, rooms)
+        return self.layouts[key]
+
+
+    def get_room(self, layout, x, y):
+        '''returns the Map of a room, each room is only made once'''
+        filename = os.path.join(self.game.base_dir, 'dungeons',
+                                f'{layout.seed}_{layout.rooms}',
+                                f'room_{x}_{y}')
+        if filename not in self.game.maps:
+            if self.tile_images is None:
+                self.tile_images = [None] + self.game.graphics['dungeon_tiles']
+            self.game.maps[filename] = tilemaps.Map(
+                    self.game, filename,
+                    room_data(layout, x, y, self.tile_images))
+        return self.game.maps[filename]
+
+
+    def create_grid(self, layout):
+        '''returns a tilemaps.Grid with the rooms of the layout'''
+        grid = tilemaps.Grid(self.game, f'dungeon {layout.seed}',
+                             layout.width, layout.height, 
+                             [layout.seed, layout.rooms])
+        for x, y in layout.doors:
+            grid.insert_grid(self.get_room(layout, x, y), x, y)
+        return grid
\ No newline at end of file
@@ -3,14 +3,20 @@ import pygame.freetype
 import inspect
 import logging
 import os
-import json
 import re
 
 import states
 import settings as st
 from load_assets import Loader
+import collisions
+import components
 import controls
-import utilities as utils
+import dungeons
+import pools
+import regions
+import render
+import saves
+import tilemaps
 
 '''
 # TODO list:
@@ -48,6 +54,9 @@ class Game():
         self.game_screen_rect = self.game_screen.get_rect()
         self.world_screen_rect = self.world_screen.get_rect()
         self.world_screen_rect.topleft = (0, st.GUI_HEIGHT)
+        # subpixel part of the camera position, applied when the game 
+        # screen is scaled (see draw_subpixel_world)
+        self.world_subpixel = (0, 0)
         
         # create a dict for graphics settings to be changed at runtime
         self.graphics_settings = {
@@ -58,11 +67,22 @@ class Game():
                 }
 
         self.fps = st.FPS
-        self.all_sprites = pg.sprite.Group()
+        # draws the sprites sorted by layer and y position (see render.py)
+        self.all_sprites = render.RenderGroup()
+        # mirrored sprite frames for reflective map layers
+        self.reflection_cache = render.ReflectionCache(st.REFLECTION_ALPHA)
         self.enemies = pg.sprite.Group()
         self.gui_elements = pg.sprite.Group()
         self.cutscene_elements = pg.sprite.Group()
         self.walls = pg.sprite.Group()
+        # sprites with hitboxes that collide with each other
+        self.colliders = pg.sprite.Group()
+        self.collisions = collisions.CollisionManager(st.COLLISION_CELL_SIZE)
+        # reuses killed enemies, walls and items (see pools.py)
+        self.sprite_pools = pools.SpritePools(st.SPRITE_POOL_LIMIT)
+        # movement and animation data of enemies, updated in bulk 
+        # (see components.py)
+        self.components = components.ComponentStore(st.TILE_WIDTH)
         
         self.base_dir = os.path.join(os.path.dirname( __file__ ), '..')
         
@@ -104,13 +124,28 @@ class Game():
         self.asset_loader = Loader(self)
         self.graphics = self.asset_loader.load_graphics()
         self.asset_loader.load_sounds()
+        if st.PRINT_LOAD_TIMES:
+            self.asset_loader.print_load_times()
         
         self.gamepad_controller = controls.GamepadController()
         self.key_getter = controls.KeyGetter(self)
         
         # load the dialog texts etc
-        with open(os.path.join(self.text_dir, 'dialogs.json')) as f:
-            self.texts = json.load(f)
+        self.texts = self.asset_loader.load_texts(
+                os.path.join(self.text_dir, 'dialogs.json'))
+        
+        self.save_manager = saves.SaveManager(self)
+        # the game data to restore when GameStart runs (see load)
+        self.loaded_save = None
+        # filename: Map, maps are loaded only once
+        self.maps = {}
+        # makes the rooms of the generated dungeons
+        self.dungeons = dungeons.DungeonGenerator(self)
+        self.autosave_writer = saves.AutosaveWriter(self.save_manager, 
+                                                    self.save_dir,
+                                                    st.AUTOSAVE_SLOTS)
+        # moves the entities of the maps the player is not on
+        self.regions = regions.RegionSimulator(self, st.REGION_WORKERS)
         
         self.setup_states()
         
@@ -158,26 +193,44 @@ class Game():
 
     
     def save(self, filename):
-        '''default save function. Saves all sprites' attributes
+        '''default save function. Saves the player, the inventory and the
+        entities of every visited map (see saves.py)
         Args:
             filename: 'example.json'
         '''
-        save_data = {}
-        for sprite in self.all_sprites.sprites():
-            # check if attribute is serializable
-            keys_ok = []
-            for key, value in sprite.__dict__.items():
-                if utils.is_jsonable(value):
-                    keys_ok.append(key)
-            save_data['all_sprites'] = {key: sprite.__dict__[key] for key in keys_ok}
-            
-        with open(os.path.join(self.save_dir, filename), 'w') as f:
-            json.dump(save_data, f)
+        self.save_manager.save(filename)
+    
+    
+    def load(self, filename):
+        '''
+        loads a save file (json or binary) and restarts the game from it
+        maps that were already loaded are reused
+        '''
+        self.loaded_save = self.save_manager.load(filename)
+        self.change_state('GameStart')
+    
+    
+    def get_map(self, filename):
+        '''returns the Map of a tmx file, each map is only loaded once'''
+        if filename not in self.maps:
+            self.maps[filename] = tilemaps.Map(self, filename)
+        return self.maps[filename]
+    
+    
+    def autosave(self):
+        '''saves the game in the background (see saves.AutosaveWriter)'''
+        if st.AUTOSAVE:
+            self.autosave_writer.submit(self.save_manager.snapshot())
 
 
     def events(self):
         '''empty the event queue and pass the events to the states'''
         self.events_list = pg.event.get()
+        # the gamepad and key states come from the events, so they are 
+        # updated on every frame, also on frames that skip the update 
+        # (see run)
+        self.gamepad_controller.update(self.events_list)
+        self.key_getter.get_input(self.gamepad_controller, self.events_list)
         for event in self.events_list:
             if event.type == pg.QUIT:
                 self.running = False
@@ -255,9 +308,8 @@ class Game():
         
 
     def update(self, dt):
-        # get input before state updates
-        self.gamepad_controller.update()
-        self.key_getter.get_input(self.gamepad_controller, self.events_list)
+        # start the next music track when the last one has faded out
+        self.asset_loader.update()
         
         #self.key_getter.test_inputs(self.keydown)
         #self.gamepad_controller.test_inputs('inputs_down')
@@ -271,6 +323,8 @@ class Game():
         cap = (f'FPS: {current_fps:2.1f}      ' +
                f'Sprites loaded: {len(self.all_sprites)}    ' +
                f'Map index: {self.map_index_x} {self.map_index_y}')
+        if self.debug_mode:
+            cap += f'    Pools: {self.sprite_pools.stats()}'
         pg.display.set_caption(cap)
         #pg.display.set_caption(str(self.state))
 
@@ -280,6 +334,8 @@ class Game():
 
     def draw(self):
         # draw everything that happens in the current state
+        # states that draw the world with the camera set the subpixel offset
+        self.world_subpixel = (0, 0)
         self.state.draw()
         
         if self.graphics_settings['window_stretched']:
@@ -307,11 +363,50 @@ class Game():
         res_screen_rect = resized_screen.get_rect()
         res_screen_rect.center = self.app_screen_rect.center
 
-        self.app_screen.blit(resized_screen, res_screen_rect)
+        self.blit_resized_screen(resized_screen, res_screen_rect)
 
         pg.display.update(res_screen_rect)
     
     
+    def blit_resized_screen(self, resized_screen, res_screen_rect):
+        '''
+        blits the scaled screen to the window with its world part moved by 
+        the subpixel camera offset, so the camera moves smoothly on large 
+        windows while the game screen is drawn at whole pixels. The GUI is 
+        not moved. Every pixel of the window is blitted once
+        '''
+        scale_x = res_screen_rect.w / self.game_screen_rect.w
+        scale_y = res_screen_rect.h / self.game_screen_rect.h
+        shift_x = round(self.world_subpixel[0] * scale_x)
+        shift_y = round(self.world_subpixel[1] * scale_y)
+        if shift_x == shift_y == 0:
+            self.app_screen.blit(resized_screen, res_screen_rect)
+            return
+        top = round(self.world_screen_rect.top * scale_y)
+        width, height = res_screen_rect.size
+        gui = pg.Rect(0, 0, width, top)
+        world = pg.Rect(0, top, width, height - top)
+        self.app_screen.blit(resized_screen, 
+                             gui.move(res_screen_rect.topleft), gui)
+        # the world part that stays on the window after the shift
+        moved = world.clip(world.move(shift_x, shift_y))
+        self.app_screen.blit(resized_screen, 
+                             moved.move(res_screen_rect.topleft),
+                             moved.move(-shift_x, -shift_y))
+        # the edges that are uncovered by the shift keep the unshifted pixels
+        edges = []
+        if shift_x:
+            x = world.x if shift_x > 0 else world.right + shift_x
+            edges.append(pg.Rect(x, world.y, abs(shift_x), world.h))
+        if shift_y:
+            y = world.y if shift_y > 0 else world.bottom + shift_y
+            edges.append(pg.Rect(world.x, y, world.w, abs(shift_y)))
+        for edge in edges:
+            edge = edge.clip(world)
+            self.app_screen.blit(resized_screen, 
+                                 edge.move(res_screen_rect.topleft), edge)
+    
+    
     def exit_game(self):
         print('Exit game')
         self.running = False
@@ -327,5 +422,8 @@ class Game():
                 self.update(delta_time)
                 self.draw()
 
+        # finish writing the last autosave before quitting
+        self.autosave_writer.close()
+        self.regions.close()
         pg.quit()
         self.avg_fps = sum(self.fps_counter) / len(self.fps_counter)
\ No newline at end of file
@@ -1,6 +1,8 @@
 import pygame as pg
 
+import collisions
 from constants import (RIGHT, DOWN, LEFT, UP)
+from pools import Poolable
 import settings as st
 
 vec = pg.Vector2
@@ -8,16 +10,22 @@ vec = pg.Vector2
 
 # ------------ Usable Items ---------------------------------------------------
 
-class Sword(pg.sprite.Sprite):
+class Sword(Poolable, pg.sprite.Sprite):
     # TODO: base item class as parent
     # TODO: change this so it doesn't require a class variable
     inventory_image_index = 0
     name = "Sword"
+    damage = 1
+    # force that pushes hit enemies away from the player
+    knockback = 20
+    # mirrored on reflective map layers (see render.py)
+    reflects = True
+    collision_layer = collisions.WEAPON
+    collision_mask = collisions.ENEMY
     def __init__(self, player, game):
-        super().__init__(game.all_sprites)
+        super().__init__(game.all_sprites, game.colliders)
 
         self.game = game
-        self.player = player
         
         img = game.graphics['sword_anim']
         self.animations = {
@@ -26,15 +34,22 @@ class Sword(pg.sprite.Sprite):
                 RIGHT: img[8:12],
                 LEFT: img[12:]
                 }
+        self.anim_delay = 0.1
         
+        self.activate(player, game)
+    
+    
+    def activate(self, player, game):
+        # sets up the sword for a new swing (it is reused by the sprite pool)
+        self.player = player
         self.anim_timer = 0
         self.anim_frame = 0
-        self.anim_delay = 0.1
         
         #self.cooldown = 15
         #self.fired = False
         self.done = False
-        self.damage = 1
+        # enemies are only hit once per swing
+        self.hit = []
         
         self.dir = self.player.lastdir
         if self.dir == UP:
@@ -59,15 +74,23 @@ class Sword(pg.sprite.Sprite):
         if self.anim_frame == len(self.animations[self.dir]) - 1:
             self.done = True
             self.kill()
-
-    # TODO: use the hitbox
-# =============================================================================
-#         for enemy in pg.sprite.spritecollide(self, self.game.enemies, False):
-#             if enemy.state != 'HITSTUN':
-#                 enemy.hp -= self.damage
-#                 enemy.knockback(self.player, 1, 0.1)
-# =============================================================================
     
+    
+    def on_collision(self, enemy):
+        # called by the collision manager (see collisions.py)
+        if enemy in self.hit:
+            return
+        self.hit.append(enemy)
+        enemy.hp -= self.damage
+        if enemy.hp <= 0:
+            enemy.kill()
+            return
+        push = enemy.pos - self.player.pos
+        if push.length() > 0:
+            push.scale_to_length(self.knockback)
+            enemy.add_force(push)
+    
+
     def draw(self, screen, pos_or_rect):
         screen.blit(self.image, pos_or_rect)
         
@@ -110,15 +133,6 @@ class Sword(pg.sprite.Sprite):
     def reset(self):
         self.fired = False
         self.anim_frame = 0
-    
-    
-    def draw_reflection(self, screen, rect):
-        reflection_image = pg.transform.flip(self.image, False, True)
-        reflection_image.fill((255, 255, 255, 125), None, pg.BLEND_RGBA_MULT)
-        reflection_rect = reflection_image.get_rect()
-        reflection_rect.x = rect.x
-        reflection_rect.y = rect.y + rect.h
-        screen.blit(reflection_image, reflection_rect)
         
 
 
@@ -127,6 +141,7 @@ class Test(Sword):
     # TODO: change this so it doesn't require a class variable
     inventory_image_index = -1
     name = "Test"
+    damage = 1000
     def __init__(self, player, game):
         super().__init__(player, game)
 
@@ -142,7 +157,5 @@ class Test(Sword):
                 LEFT: img[12:]
                 }
 
-        self.damage = 1000
-
 
     
\ No newline at end of file
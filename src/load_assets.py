@@ -1,11 +1,18 @@
 import pygame as pg
 import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+import audio
+import settings as st
+from bundle import Bundle, bundle_key
 
-# TODO: multiple music channels?
 
 class Loader():
     def __init__(self, game):
+        # wall-clock start of the asset loading, for the load time report
+        self.start_time = time.perf_counter()
         self.game = game
         base_dir = game.base_dir
         self.graphics_folder = os.path.join(base_dir, 'assets', 'graphics')
@@ -14,74 +21,217 @@ class Loader():
         self.tileset_folder = os.path.join(self.graphics_folder, 'tilesets')
         self.gui_image_folder = os.path.join(self.graphics_folder, 'GUI')
         self.font_folder = os.path.join(base_dir, 'assets', 'fonts')
-            
-        self.channel = None
+        self.manifest_file = os.path.join(base_dir, 'assets', 'manifest.json')
+        self.atlas_folder = os.path.join(self.graphics_folder, 'atlas')
+        self.atlas_index_file = os.path.join(self.atlas_folder, 'atlas.json')
+        self.bundle_file = os.path.join(base_dir, 'data', 'assets.bundle')
         
         # TODO: dict comprehension
         self.fonts = {
                 'slkscr': os.path.join(self.font_folder, 'slkscr.ttf')
                 }
         
+        # the manifest declares every asset the game uses
+        # (strips, frame counts, volumes)
+        with open(self.manifest_file) as f:
+            self.manifest = json.load(f)
+        
+        # seconds spent decoding each asset file, for the load time report
+        # (the files are decoded in parallel, so these add up to more than
+        # the wall-clock time of the loading)
+        self.load_times = {}
+        
+        self.bundle = self.open_bundle()
+        
+        
+    def open_bundle(self):
+        '''
+        returns the compiled asset bundle (see compile_assets.py), 
+        or None if there is none or if it is out of date
+        '''
+        if not st.USE_ASSET_BUNDLE or not os.path.exists(self.bundle_file):
+            return None
+        bundle = Bundle(self.bundle_file)
+        if not bundle.is_up_to_date(self.game.base_dir):
+            print('Asset bundle is out of date, loading the source files. '
+                  'Run compile_assets.py to rebuild it.')
+            return None
+        return bundle
+    
+    
+    def load_bundled_map(self, filename):
+        '''returns the map data from the bundle or None if it isn't bundled'''
+        key = bundle_key(self.game.base_dir, filename)
+        if not self.bundle or not self.bundle.has_map(key):
+            return None
+        start = time.perf_counter()
+        map_data = self.bundle.load_map(key)
+        self.load_times[key] = time.perf_counter() - start
+        return map_data
+    
+    
+    def load_texts(self, filename):
+        key = bundle_key(self.game.base_dir, filename)
+        # texts that are not bundled yet are loaded from their file
+        if self.bundle and self.bundle.has_text(key):
+            return self.bundle.load_text(key)
+        with open(filename) as f:
+            return json.load(f)
+        
+        
+    def decode_files(self, folder, files, decode):
+        '''
+        decodes a list of files in a thread pool
+        Args:
+            folder: the folder the file names are relative to
+            files: list of file names
+            decode: function that takes a path and returns the decoded object
+        returns a dict with file: decoded object
+        '''
+        def timed_decode(f):
+            start = time.perf_counter()
+            obj = decode(os.path.join(folder, f))
+            return obj, time.perf_counter() - start
+        
+        with ThreadPoolExecutor(max_workers=st.LOADER_THREADS) as pool:
+            results = dict(zip(files, pool.map(timed_decode, files)))
+
+        decoded = {}
+        for f, (obj, seconds) in results.items():
+            decoded[f] = obj
+            self.load_times[f] = seconds
+        return decoded
+        
         
     def load_graphics(self):
         '''
         load sprite image strips here
         '''
-        sprite_files = list(filter(lambda x: x[-3:]=='png', os.listdir(self.sprite_folder)))
-        sprite_images = {f[:-4] : pg.image.load(os.path.join(self.sprite_folder, f)).convert_alpha() 
-                         for f in sprite_files}
-
-        gui_image_files = list(filter(lambda x: x[-3:]=='png', 
-                                      os.listdir(self.gui_image_folder)))
-        gui_images = {f[:-4] : pg.image.load(os.path.join(self.gui_image_folder, f)).convert_alpha()
-                      for f in gui_image_files}
-        
-        gfx_lib = {
-                'knight_images': self.images_from_strip(sprite_images['knight_strip'], 10),
-                'knight_attack': self.images_from_strip(sprite_images['knight_attack'], 4),
-                'sword_anim': self.images_from_strip(sprite_images['sword_anim'], 16),
-                'sword': sprite_images['sword'],
-                'inventory_bg': gui_images['inventory_bg'],
-                'inventory_images': self.images_from_strip(gui_images['inv_item_strip'], None, (16, 16)),
-                'cursor_images': self.images_from_strip(gui_images['cursor'], 2),
-                'arrow_images': self.images_from_strip(gui_images['arrows'], None, (8, 8)),
-                'health_string': gui_images['health_string'],
-                'heart_images': self.images_from_strip(gui_images['hearts_strip'], 6),
-                'magicbar': gui_images['magicbar'],
-                'arrows': self.images_from_strip(gui_images['arrows'], 4),
-                'minimap_images': self.images_from_strip(gui_images['minimap_strip_7x5'], 20),
-                'magic_and_items': gui_images['magic_and_items'],
-                'enemy_skeleton': self.images_from_strip(sprite_images['skeleton_strip'], 7)
-                }
+        index = self.load_atlas_index()
+        if index:
+            return self.load_graphics_from_atlas(index)
+        
+        entries = self.manifest['graphics']
+        # some strips are sliced in more than one way, so decode every 
+        # file only once
+        files = sorted({entry['file'] for entry in entries.values()})
+        images = self.convert_images(files)
+        
+        gfx_lib = {}
+        for key, entry in entries.items():
+            image = images[entry['file']]
+            if is_strip(entry):
+                gfx_lib[key] = self.images_from_strip(image, 
+                                                      entry.get('frames'),
+                                                      entry.get('tilesize'),
+                                                      entry.get('rows', 1))
+            else:
+                gfx_lib[key] = image
         return gfx_lib
     
     
-    def load_sounds(self):
-        pg.mixer.init()
-        
-        bgm_folder = os.path.join(self.sounds_folder, 'bgm')
-        sfx_folder = os.path.join(self.sounds_folder, 'sfx')
+    def convert_images(self, files):
+        # decoding doesn't need the display and can run in worker threads,
+        # but converting to the display format has to happen on the main thread
+        images = self.decode_files(self.graphics_folder, files, pg.image.load)
+        for f, image in images.items():
+            start = time.perf_counter()
+            images[f] = image.convert_alpha()
+            self.load_times[f] += time.perf_counter() - start
+        return images
+    
+    
+    def load_atlas_index(self):
+        '''
+        returns the atlas index made by build_atlas.py, or None if there is
+        no atlas or if it is older than the manifest or any of its sources
+        '''
+        if not os.path.exists(self.atlas_index_file):
+            return None
+        with open(self.atlas_index_file) as f:
+            index = json.load(f)
         
-        music_files = list(filter(lambda x: x[-3:]=='mp3' or x[-3:]=='ogg', 
-                                  os.listdir(bgm_folder)))
-        music_objects = {f[:-4]: os.path.join(bgm_folder, f)
-                         for f in music_files}
+        built = os.path.getmtime(self.atlas_index_file)
+        sources = [self.manifest_file] + [
+                os.path.join(self.graphics_folder, f) for f in index['sources']]
+        files = {entry['file'] for entry in self.manifest['graphics'].values()}
+        if (not files.issubset(index['sources']) or 
+            any(os.path.getmtime(f) > built for f in sources)):
+            print('Texture atlas is out of date, loading the source images. '
+                  'Run build_atlas.py to rebuild it.')
+            return None
+        return index
+    
+    
+    def load_graphics_from_atlas(self, index):
+        # all frames are subsurfaces of a few atlas pages
+        page_files = [os.path.join('atlas', p) for p in index['pages']]
+        images = self.convert_images(page_files)
+        pages = [images[f] for f in page_files]
         
-        sfx_files = list(filter(lambda x: x[-3:]=='mp3' or x[-3:]=='wav', 
-                                  os.listdir(sfx_folder)))
-        sfx_objects = {f[:-4]: pg.mixer.Sound(os.path.join(sfx_folder, f))
-                        for f in sfx_files}
+        gfx_lib = {}
+        for key, entry in self.manifest['graphics'].items():
+            frames = [pages[page].subsurface(rect) 
+                      for page, *rect in index['frames'][key]]
+            if is_strip(entry):
+                gfx_lib[key] = frames
+            else:
+                gfx_lib[key] = frames[0]
+        return gfx_lib
+    
+    
+    def load_sounds(self):
+        pg.mixer.init()
+        # reserve all channels so pygame never picks one automatically
+        # (the music is streamed and doesn't use a channel)
+        pg.mixer.set_num_channels(st.SFX_CHANNELS)
+        pg.mixer.set_reserved(st.SFX_CHANNELS)
+        channels = [pg.mixer.Channel(i) for i in range(st.SFX_CHANNELS)]
+        self.music_player = audio.MusicPlayer(st.MUSIC_FADE_MS)
+        self.channel_pool = audio.ChannelPool(channels, st.SFX_VOICE_LIMITS)
         
-        # sound libs stored as (filename, relative volume)
+        # music is streamed, so only store the file paths
         self.music_lib = {
-                'overworld': (music_objects['A_Journey_Awaits'], 0.9),
-                'dungeon1': (music_objects['Memoraphile_Spooky_Dungeon'], 0.8)
+                key: (os.path.join(self.sounds_folder, entry['file']), 
+                      entry['volume'])
+                for key, entry in self.manifest['music'].items()
                 }
         
-        self.sfx_lib = {
-                'test_sound': (sfx_objects['Pickup_Coin35'], 1),
-                'sword_slash': (sfx_objects['slash'], 1)
-                }
+        # sound effects are decoded when they are played for the first time
+        self.sound_cache = audio.SoundCache(st.SFX_CACHE_BUDGET)
+        # sound libs stored as (filename, relative volume, category, priority)
+        self.sfx_lib = {key: (os.path.join(self.sounds_folder, entry['file']),
+                              entry['volume'], 
+                              entry.get('category', 'default'), 
+                              entry.get('priority', 0))
+                        for key, entry in self.manifest['sfx'].items()}
+    
+    
+    def prewarm_sounds(self, sound_set):
+        '''
+        decodes a set of sound effects from the manifest in the background
+        so they are ready when they are played the first time
+        '''
+        if not self.game.sound_settings['sound_on']:
+            return
+        keys = self.manifest['sound_sets'][sound_set]
+        self.sound_cache.prewarm([self.sfx_lib[key][0] for key in keys])
+    
+    
+    def print_load_times(self):
+        '''
+        prints the wall-clock time since the loader was created, and the
+        decode time of every asset file
+        '''
+        wall_time = time.perf_counter() - self.start_time
+        decode_time = sum(self.load_times.values())
+        print(f'Assets loaded in {wall_time * 1000:.1f} ms '
+              f'({decode_time * 1000:.1f} ms decode time of all threads)')
+        # print the slowest assets first
+        print('Decode time per file:')
+        for f, seconds in sorted(self.load_times.items(), 
+                                 key=lambda x: x[1], reverse=True):
+            print(f'    {seconds * 1000:7.2f} ms  {f}')
         
         
     def play_music(self, key, loop=True):
@@ -92,43 +242,55 @@ class Loader():
             loops = -1
         else:
             loops = 0
-        pg.mixer.music.load(self.music_lib[key][0])
-        pg.mixer.music.play(loops)
-        volume = self.game.sound_settings['music_vol'] * self.music_lib[key][1]
-        pg.mixer.music.set_volume(volume)
+        filename, rel_volume = self.music_lib[key]
+        volume = self.game.sound_settings['music_vol'] * rel_volume
+        # the track is faded in when the current one has faded out
+        self.music_player.play(filename, volume, loops)
         
           
     def play_sound(self, key):
         # check if sound is muted
         if not self.game.sound_settings['sound_on']:
             return
-        sound = self.sfx_lib[key][0]
-        volume = self.game.sound_settings['sfx_vol'] * self.sfx_lib[key][1]
-        sound.set_volume(volume)
-        # play the sound if it isn't already being played
-        if self.channel is None:
-            self.channel = sound.play()
-        else:
-            if self.channel.get_sound() == sound:
-                if not self.channel.get_busy():
-                    self.channel = sound.play()
-            else:
-                self.channel = sound.play()
+        filename, rel_volume, category, priority = self.sfx_lib[key]
+        sound = self.sound_cache.get(filename)
+        volume = self.game.sound_settings['sfx_vol'] * rel_volume
+        self.channel_pool.play(sound, volume, category, priority)
+    
+    
+    def update(self):
+        self.music_player.update()
+        self.sound_cache.update()
             
     
-    def images_from_strip(self, strip, number=None, tilesize=None):
-        # TODO: change this so it can process multiline images
-        if number:
-            img_w = strip.get_width() // number
-            img_h = strip.get_height()
-        elif tilesize:
-            img_w = tilesize[0]
-            img_h = tilesize[1]
-            number = strip.get_size()[0] // img_w
-        
-        images = []
-        for i in range(number):
-            s = strip.subsurface((i * img_w, 0, img_w, img_h))
-            images.append(s)
+    def images_from_strip(self, strip, number=None, tilesize=None, rows=1):
+        rects = strip_rects(strip.get_size(), number, tilesize, rows)
+        return [strip.subsurface(r) for r in rects]
+
+
 
-        return images
\ No newline at end of file
+def is_strip(entry):
+    # manifest entries with a frame count or frame size are sliced into lists
+    return 'frames' in entry or 'tilesize' in entry
+
+
+def strip_rects(size, number=None, tilesize=None, rows=1):
+    '''
+    returns the frame rects of an image strip, row by row
+    Args:
+        size: (width, height) of the strip
+        number: frames per row
+        tilesize: (width, height) of a frame, used if number is not given
+        rows: number of rows (only used together with number)
+    '''
+    if number:
+        img_w = size[0] // number
+        img_h = size[1] // rows
+    elif tilesize:
+        img_w = tilesize[0]
+        img_h = tilesize[1]
+        number = size[0] // img_w
+        rows = size[1] // img_h
+    
+    return [pg.Rect(i * img_w, j * img_h, img_w, img_h)
+            for j in range(rows) for i in range(number)]
\ No newline at end of file
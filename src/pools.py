@@ -0,0 +1,121 @@
+from abc import ABC, abstractmethod
+
+
+'''
+Sprite pools
+
+Sprites that are created and killed often (enemies and walls on every map
+change, items on every use) are kept after kill() and reused instead of
+creating new objects.
+
+A pooled sprite class inherits from Poolable and implements
+    activate(*args): sets the sprite up for a new use, it gets the same
+                     arguments as __init__
+    reset(): optional, called when the sprite is killed and goes back to
+             the pool
+The sprite is added to the same groups it was in when it was killed.
+'''
+
+
+
+class Poolable(ABC):
+    # the SpritePool this sprite belongs to
+    pool = None
+
+    def kill(self):
+        if self.pool is not None and self.alive():
+            self.pool_groups = self.groups()
+            super().kill()
+            self.reset()
+            self.pool.release(self)
+        else:
+            super().kill()
+
+
+    def reset(self):
+        pass
+
+
+    @abstractmethod
+    def activate(self, *args):
+        '''sets the sprite up for a new use, with the arguments of __init__'''
+
+
+
+class SpritePool():
+    def __init__(self, sprite_class, limit):
+        self.sprite_class = sprite_class
+        self.limit = limit
+        self.free = []
+        # number of sprites that were reused (hits) or created (misses)
+        self.hits = 0
+        self.misses = 0
+
+
+    def get(self, *args):
+        if self.free:
+            self.hits += 1
+            sprite = self.free.pop()
+            sprite.activate(*args)
+            sprite.add(sprite.pool_groups)
+        else:
+            self.misses += 1
+            sprite = self.sprite_class(*args)
+            sprite.pool = self
+        return sprite
+
+
+    def release(self, sprite):
+        if len(self.free) < self.limit:
+            self.free.append(sprite)
+
+
+    def __repr__(self):
+        return (f'{self.sprite_class.__name__}: {self.hits} hits, '
+                f'{self.misses} misses, {len(self.free)} free')
+
+
+
+class SpritePools():
+    '''creates sprites through one SpritePool per Poolable sprite class'''
+    def __init__(self, limit):
+        self.limit = limit
+        self.pools = {}
+
+
+    def pool_for(self, sprite_class):
+        '''returns the SpritePool of the class, None if it is not Poolable'''
+        if not issubclass(sprite_class, Poolable):
+            return None
+        pool = self.pools.get(sprite_class)
+        if pool is None:
+            pool = self.pools[sprite_class] = SpritePool(sprite_class,
+                                                         self.limit)
+        return pool
+
+
+    def spawn(self, sprite_class, *args):
+        '''returns a new or reused sprite, created with the arguments'''
+        pool = self.pool_for(sprite_class)
+        if pool is None:
+            return sprite_class(*args)
+        return pool.get(*args)
+
+
+    def spawn_many(self, sprite_class, game, records):
+        '''spawns one sprite of the same class for each spawn record'''
+        pool = self.pool_for(sprite_class)
+        if pool is None:
+            return [sprite_class(game, record) for record in records]
+        return [pool.get(game, record) for record in records]
+
+
+    def stats(self):
+        '''returns {class name: (hits, misses, free sprites)}'''
+        return {cls.__name__: (pool.hits, pool.misses, len(pool.free))
+                for cls, pool in self.pools.items()}
+
+
+    def clear(self):
+        for pool in self.pools.values():
+            pool.free.clear()
\ No newline at end of file
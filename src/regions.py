@@ -0,0 +1,233 @@
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import multiprocessing
+import os
+import random
+
+import settings as st
+
+
+'''
+Off-screen region simulation
+
+Only the map the player is on has sprites. The entities of the other maps
+of the overworld grid only exist as their saved values in the SaveManager
+(see saves.py), so without this they would wait exactly where the player
+left them.
+
+The RegionSimulator ticks these maps every st.REGION_TICK seconds in a pool
+of worker processes. A map is sent to a worker in a compact form:
+    region:   (tiles wide, tiles high, tile size, blocked tiles), the 
+              blocked tiles are a bytes object with one byte per tile
+    entities: array of doubles with id, x, y, lastdir of every living 
+              entity whose type is in SIMULATED_TYPES
+and the worker returns the entities array with the new positions. Both
+are pickled as flat buffers, so sending a job takes next to no time on the
+main thread. The update
+is coarse (one wandering step every WANDER_DELAY seconds, tile by tile,
+like Enemy.Wandering), there are no sprites, physics or collisions.
+
+The main thread never waits for a worker. Finished results are merged into
+the saved values at the start of the next update (or when the player enters
+a map), so the map spawns its sprites where the simulation left them.
+A result that is not finished when the player enters its map is dropped,
+the sprites on the current map are the live state.
+
+The workers are spawned processes that import the main module again, so
+scripts that start a game need an  if __name__ == '__main__':  guard.
+'''
+
+# the saved entity types that are moved by the simulation
+SIMULATED_TYPES = ('Enemy',)
+# seconds between two wandering steps (Enemy.Wandering.walk_delay)
+WANDER_DELAY = 3
+# the maximum number of tiles of a wandering step
+WANDER_TILES = 3
+# movement of the directions (same order as in sprites.py)
+DIRECTIONS = ((1, 0), (0, 1), (-1, 0), (0, -1))
+
+
+
+def init_worker():
+    '''runs once in each worker process'''
+    # the game gets the cpu first if there are not enough cores for all
+    if hasattr(os, 'nice'):
+        os.nice(10)
+
+
+def region_data(map_):
+    '''returns the compact data of a tilemaps.Map that the workers need'''
+    tile = int(map_.tilesize.x)
+    width, height = map_.width, map_.height
+    blocked = bytearray(width * height)
+    for x, y, w, h in map_.wall_rects():
+        for tile_x in range(max(int(x) // tile, 0), 
+                            min((int(x + w) - 1) // tile + 1, width)):
+            for tile_y in range(max(int(y) // tile, 0),
+                                min((int(y + h) - 1) // tile + 1, height)):
+                blocked[tile_y * width + tile_x] = 1
+    return (width, height, tile, bytes(blocked))
+
+
+def simulate_region(region, entities, steps, seed):
+    '''
+    runs in a worker process: does steps wandering steps for each entity
+    and returns the entities array with their new positions
+    '''
+    width, height, tile, blocked = region
+    rng = random.Random(seed)
+    for i in range(0, len(entities), 4):
+        x = entities[i + 1]
+        y = entities[i + 2]
+        lastdir = entities[i + 3]
+        for _ in range(steps):
+            lastdir = rng.randrange(len(DIRECTIONS))
+            dx, dy = DIRECTIONS[lastdir]
+            # walk tile by tile until a wall or the map border
+            for _ in range(rng.randint(1, WANDER_TILES)):
+                tile_x = int((x + dx * tile) // tile)
+                tile_y = int((y + dy * tile) // tile)
+                if (not (0 <= tile_x < width and 0 <= tile_y < height) or
+                        blocked[tile_y * width + tile_x]):
+                    break
+                x += dx * tile
+                y += dy * tile
+        entities[i + 1] = x
+        entities[i + 2] = y
+        entities[i + 3] = lastdir
+    return entities
+
+
+
+class RegionSimulator():
+    def __init__(self, game, workers):
+        self.game = game
+        self.workers = workers
+        # the process pool (see start)
+        self.executor = None
+        # map key: (future, steps) of the running job
+        self.pending = {}
+        # map key: seconds that were not simulated yet
+        self.elapsed = {}
+        # map key: region data (see region_data)
+        self.regions = {}
+        self.timer = 0
+        # number of submitted jobs, used as the random seed
+        self.jobs = 0
+
+
+    def update(self, dt):
+        self.collect()
+        self.timer += dt
+        if self.timer < st.REGION_TICK:
+            return
+        maps = {map_.key: map_ for column in self.game.overworld_grid.map
+                for map_ in column if map_}
+        records = self.game.save_manager.records
+        for key, saved in records.items():
+            if key == self.game.map.key or key not in maps:
+                continue
+            self.elapsed[key] = self.elapsed.get(key, 0) + self.timer
+            steps = int(self.elapsed[key] // WANDER_DELAY)
+            if steps and key not in self.pending:
+                entities = array('d')
+                for id_, values in saved.items():
+                    if values['alive'] and values['type'] in SIMULATED_TYPES:
+                        pos = values['pos']
+                        entities.extend((id_, pos[0], pos[1], 
+                                         values['lastdir']))
+                self.elapsed[key] -= steps * WANDER_DELAY
+                if entities:
+                    self.submit(key, maps[key], entities, steps)
+        self.timer = 0
+
+
+    def start(self):
+        '''
+        starts the worker processes, starting them with the first job
+        would take longer than a frame
+        '''
+        if self.executor is not None:
+            return
+        # spawned workers don't inherit the game's threads and window
+        self.executor = ProcessPoolExecutor(
+                self.workers, multiprocessing.get_context('spawn'), 
+                init_worker)
+        for _ in range(self.workers):
+            self.executor.submit(int)
+
+
+    def submit(self, key, map_, entities, steps):
+        self.start()
+        if key not in self.regions:
+            self.regions[key] = region_data(map_)
+        self.jobs += 1
+        future = self.executor.submit(
+                simulate_region, self.regions[key], entities, steps, self.jobs)
+        self.pending[key] = (future, steps)
+
+
+    def collect(self):
+        '''merges the results of the finished jobs into the saved values'''
+        for key, (future, steps) in list(self.pending.items()):
+            if not future.done():
+                continue
+            del self.pending[key]
+            if not future.cancelled() and future.exception() is None:
+                self.merge(key, future.result())
+                continue
+            if not future.cancelled():
+                logging.error(f'Simulation of {key} failed: '
+                              f'{future.exception()!r}')
+            # the steps are done again with the next job of the map
+            self.elapsed[key] = (self.elapsed.get(key, 0) + 
+                                 steps * WANDER_DELAY)
+
+
+    def merge(self, key, entities):
+        save_manager = self.game.save_manager
+        records = save_manager.records.get(key)
+        if records is None:
+            return
+        for i in range(0, len(entities), 4):
+            values = records.get(int(entities[i]))
+            if values and values['alive']:
+                # saved values are never changed, they are replaced
+                records[int(entities[i])] = dict(
+                        values, pos=[entities[i + 1], entities[i + 2]],
+                        lastdir=int(entities[i + 3]))
+        save_manager.frozen[key] = None
+
+
+    def enter(self, key):
+        '''called before the sprites of a map are spawned from its saved values'''
+        self.collect()
+        # the sprites of the map are the live state now, so the time of an
+        # unfinished job is dropped with the rest of the elapsed time
+        future, _ = self.pending.pop(key, (None, 0))
+        if future:
+            future.cancel()
+        self.elapsed.pop(key, None)
+
+
+    def clear(self):
+        '''forgets the jobs and timers of a running game'''
+        for future, _ in self.pending.values():
+            future.cancel()
+        self.pending = {}
+        self.elapsed = {}
+        self.timer = 0
+
+
+    def close(self):
+        '''stops the workers without waiting for the running jobs'''
+        self.clear()
+        if self.executor is not None:
+            try:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+            except TypeError:
+                # before python 3.9, the jobs that did not start are
+                # already cancelled by clear
+                self.executor.shutdown(wait=False)
+            self.executor = None
\ No newline at end of file
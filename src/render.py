@@ -0,0 +1,148 @@
+import pygame as pg
+from bisect import insort
+import weakref
+
+import settings as st
+
+
+'''
+Render queue for the world sprites
+
+Every sprite and every map tile layer has a layer number. Sprites set it
+with a 'layer' attribute (or the Tiled property 'layer'), otherwise they are
+drawn on st.SPRITE_LAYER. Map layers without the property are on layer 0.
+Map layers are drawn before the sprites of the same layer, so a map layer
+with a higher number than the sprites is drawn above them.
+
+Within a layer the sprites are drawn from top to bottom (by rect.bottom),
+so a sprite in front of another one covers it.
+
+Sprites with 'reflects = True' are mirrored on reflective map layers
+(see tilemaps.Map.draw_reflections).
+'''
+
+
+
+def sort_by_bottom(sprites):
+    '''
+    insertion sort by rect.bottom, in place
+    the lists are sorted from the last frame and sprites move only a few
+    pixels per frame, so this usually takes one comparison per sprite
+    '''
+    keys = [sprite.rect.bottom for sprite in sprites]
+    for i in range(1, len(sprites)):
+        key = keys[i]
+        if key >= keys[i - 1]:
+            continue
+        sprite = sprites[i]
+        j = i - 1
+        while j >= 0 and keys[j] > key:
+            keys[j + 1] = keys[j]
+            sprites[j + 1] = sprites[j]
+            j -= 1
+        keys[j + 1] = key
+        sprites[j + 1] = sprite
+
+
+
+class ReflectionCache():
+    '''
+    mirrored and faded copies of sprite frames
+    a reflection is made the first time a frame is reflected and shared by
+    all sprites that use the frame. It is dropped when the frame is
+    garbage collected, so temporary images (like damage flicker) don't fill
+    the cache
+    '''
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.reflections = weakref.WeakKeyDictionary()
+
+
+    def get(self, image):
+        reflection = self.reflections.get(image)
+        if reflection is None:
+            reflection = pg.transform.flip(image, False, True)
+            reflection.fill((255, 255, 255, self.alpha), None, 
+                            pg.BLEND_RGBA_MULT)
+            self.reflections[image] = reflection
+        return reflection
+
+
+
+class RenderGroup(pg.sprite.Group):
+    '''
+    sprite group that keeps its sprites in drawing order
+    the layers are lists that stay sorted between frames instead of being
+    sorted again every frame
+    '''
+    def __init__(self, *sprites):
+        # layer number: sprites in drawing order
+        self.layers = {}
+        # the layer numbers in drawing order
+        self.layer_order = []
+        # sprite: layer number
+        self.sprite_layers = {}
+        # sprites that are reflected on reflective map layers
+        self.reflecting = []
+        super().__init__(*sprites)
+
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite)
+        if layer is None:
+            layer = getattr(sprite, 'layer', st.SPRITE_LAYER)
+        if layer not in self.layers:
+            self.layers[layer] = []
+            insort(self.layer_order, layer)
+        # new sprites might not have a rect yet, they are moved to their
+        # place by the next sort
+        self.layers[layer].append(sprite)
+        self.sprite_layers[sprite] = layer
+        if getattr(sprite, 'reflects', False):
+            self.reflecting.append(sprite)
+
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.layers[self.sprite_layers.pop(sprite)].remove(sprite)
+        if sprite in self.reflecting:
+            self.reflecting.remove(sprite)
+
+
+    def change_layer(self, sprite, layer):
+        self.layers[self.sprite_layers[sprite]].remove(sprite)
+        self.reflecting = [s for s in self.reflecting if s is not sprite]
+        del self.sprite_layers[sprite]
+        self.add_internal(sprite, layer)
+
+
+    def draw_layer(self, screen, camera, layer):
+        # moving the rects by the offset directly is cheaper than 
+        # camera.apply or reusing rects with camera.apply_rects
+        # (see benchmarks/bench_camera.py)
+        offset = camera.offset
+        for sprite in self.layers[layer]:
+            sprite.draw(screen, sprite.rect.move(offset))
+
+
+    def draw_world(self, screen, camera, map_):
+        '''draws the layers of the map (tilemaps.Map) and the sprites in layer order'''
+        for sprites in self.layers.values():
+            sort_by_bottom(sprites)
+
+        map_pos = camera.apply_bg(map_.rect)
+        order = self.layer_order
+        i = 0
+        # the map layers are sorted by layer number
+        for map_layer in map_.layers:
+            # sprites on lower layers are drawn below this map layer
+            while i < len(order) and order[i] < map_layer.layer:
+                self.draw_layer(screen, camera, order[i])
+                i += 1
+            screen.blit(map_layer.image, map_pos)
+            map_.draw_animated_tiles(screen, map_layer, map_pos.topleft)
+            if map_layer.reflective:
+                map_.draw_reflections(screen, camera, self.reflecting)
+
+        for layer in order[i:]:
+            self.draw_layer(screen, camera, layer)
\ No newline at end of file
@@ -0,0 +1,331 @@
+import struct
+from array import array
+
+
+'''
+Binary save file format (see saves.py for what is saved)
+
+Layout:
+    header: magic bytes, format version
+    string table: every string of the save (map keys, type names, field
+                  names, item names, dict keys) is stored once and
+                  referenced by its index
+    game data: current map, grid position, grid key (version 2), player 
+               values, item slots and the inventory grid
+    maps: the entities of every map, grouped by type. Each group stores
+          the entity ids, the alive flags and one column per save field.
+          Numeric columns and positions are packed arrays, other values
+          use a small tagged encoding (like msgpack)
+
+All numbers are little endian. Lengths and string indices are unsigned
+variable length integers (7 bits per byte).
+'''
+
+MAGIC = b'DCSAVE\x00\x00'
+VERSION = 2
+HEADER = struct.Struct('<8sI')
+
+# tags of single values
+NONE, FALSE, TRUE, INT, FLOAT, STRING, LIST, DICT = range(8)
+# column types
+COLUMN_INT, COLUMN_FLOAT, COLUMN_VEC, COLUMN_VALUES = range(4)
+
+INT64 = struct.Struct('<q')
+FLOAT64 = struct.Struct('<d')
+GRID_POS = struct.Struct('<ii')
+
+
+def is_save_file(data):
+    return data[:len(MAGIC)] == MAGIC
+
+
+def column_type(values):
+    '''returns the most compact column type for a list of values'''
+    if all(type(v) is int for v in values):
+        return COLUMN_INT
+    if all(type(v) in (int, float) for v in values):
+        return COLUMN_FLOAT
+    if all(type(v) is list and len(v) == 2 and
+           all(type(n) in (int, float) for n in v) for v in values):
+        return COLUMN_VEC
+    return COLUMN_VALUES
+
+
+
+class Writer():
+    def __init__(self):
+        self.buffer = bytearray()
+        self.strings = {}
+
+
+    def uint(self, n):
+        while n >= 0x80:
+            self.buffer.append(n & 0x7f | 0x80)
+            n >>= 7
+        self.buffer.append(n)
+
+
+    def string_index(self, s):
+        # strings are written to the table at the end
+        return self.strings.setdefault(s, len(self.strings))
+
+
+    def string(self, s):
+        self.uint(self.string_index(s))
+
+
+    def optional_string(self, s):
+        # 0 means None, so the indices are shifted by one
+        self.uint(0 if s is None else self.string_index(s) + 1)
+
+
+    def array(self, typecode, values):
+        data = array(typecode, values).tobytes()
+        self.uint(len(data))
+        self.buffer += data
+
+
+    def value(self, value):
+        t = type(value)
+        if value is None:
+            self.buffer.append(NONE)
+        elif t is bool:
+            self.buffer.append(TRUE if value else FALSE)
+        elif t is int:
+            self.buffer.append(INT)
+            self.buffer += INT64.pack(value)
+        elif t is float:
+            self.buffer.append(FLOAT)
+            self.buffer += FLOAT64.pack(value)
+        elif t is str:
+            self.buffer.append(STRING)
+            self.string(value)
+        elif t in (list, tuple):
+            self.buffer.append(LIST)
+            self.uint(len(value))
+            for v in value:
+                self.value(v)
+        elif t is dict:
+            self.buffer.append(DICT)
+            self.uint(len(value))
+            for k, v in value.items():
+                self.string(str(k))
+                self.value(v)
+        else:
+            raise TypeError(f'Can not save {value!r} of type {t.__name__}')
+
+
+    def column(self, values):
+        kind = column_type(values)
+        self.buffer.append(kind)
+        if kind == COLUMN_INT:
+            self.array('q', values)
+        elif kind == COLUMN_FLOAT:
+            self.array('d', values)
+        elif kind == COLUMN_VEC:
+            self.array('d', [n for v in values for n in v])
+        else:
+            for v in values:
+                self.value(v)
+
+
+    def entities(self, records):
+        '''writes the records of one map grouped by type and save fields'''
+        groups = {}
+        for id_, values in records.items():
+            fields = tuple(f for f in values if f not in ('type', 'alive'))
+            groups.setdefault((values['type'], fields), []).append(id_)
+
+        self.uint(len(groups))
+        for (type_name, fields), ids in groups.items():
+            self.string(type_name)
+            self.uint(len(fields))
+            for field in fields:
+                self.string(field)
+            self.uint(len(ids))
+            self.array('I', ids)
+            self.array('B', [records[i]['alive'] for i in ids])
+            for field in fields:
+                self.column([records[i][field] for i in ids])
+
+
+    def game(self, data, maps):
+        self.string(data['map'])
+        self.buffer += GRID_POS.pack(*data['map_index'])
+        self.value(data['grid'])
+        self.value(data['player'])
+
+        self.uint(len(data['items']))
+        for slot, name in data['items'].items():
+            self.string(slot)
+            self.optional_string(name)
+
+        inventory = data['inventory']
+        self.uint(len(inventory))
+        self.uint(len(inventory[0]) if inventory else 0)
+        for row in inventory:
+            for name in row:
+                self.optional_string(name)
+
+        self.uint(len(maps))
+        for key, records in maps.items():
+            self.string(key)
+            self.entities(records)
+
+
+    def getvalue(self):
+        body = self.buffer
+        self.buffer = bytearray(HEADER.pack(MAGIC, VERSION))
+        # the table is ordered by index
+        self.uint(len(self.strings))
+        for s in self.strings:
+            data = s.encode('utf-8')
+            self.uint(len(data))
+            self.buffer += data
+        return bytes(self.buffer + body)
+
+
+
+class Reader():
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.pos = 0
+
+
+    def uint(self):
+        n = 0
+        shift = 0
+        while True:
+            byte = self.data[self.pos]
+            self.pos += 1
+            n |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return n
+            shift += 7
+
+
+    def unpack(self, fmt):
+        values = fmt.unpack_from(self.data, self.pos)
+        self.pos += fmt.size
+        return values
+
+
+    def bytes(self, length):
+        data = self.data[self.pos:self.pos + length]
+        self.pos += length
+        return data
+
+
+    def string(self):
+        return self.strings[self.uint()]
+
+
+    def optional_string(self):
+        index = self.uint()
+        return None if index == 0 else self.strings[index - 1]
+
+
+    def dict(self, read_key, read_value):
+        # read in a loop to keep the order of keys and values
+        result = {}
+        for _ in range(self.uint()):
+            key = read_key()
+            result[key] = read_value()
+        return result
+
+
+    def array(self, typecode):
+        values = array(typecode)
+        values.frombytes(self.bytes(self.uint()))
+        return values
+
+
+    def value(self):
+        tag = self.data[self.pos]
+        self.pos += 1
+        if tag == NONE:
+            return None
+        if tag == FALSE:
+            return False
+        if tag == TRUE:
+            return True
+        if tag == INT:
+            return self.unpack(INT64)[0]
+        if tag == FLOAT:
+            return self.unpack(FLOAT64)[0]
+        if tag == STRING:
+            return self.string()
+        if tag == LIST:
+            return [self.value() for _ in range(self.uint())]
+        if tag == DICT:
+            return self.dict(self.string, self.value)
+        raise ValueError(f'Unknown value tag {tag} at byte {self.pos - 1}')
+
+
+    def column(self, count):
+        kind = self.data[self.pos]
+        self.pos += 1
+        if kind == COLUMN_INT or kind == COLUMN_FLOAT:
+            return self.array('q' if kind == COLUMN_INT else 'd').tolist()
+        if kind == COLUMN_VEC:
+            flat = self.array('d')
+            return [[flat[i], flat[i + 1]] for i in range(0, len(flat), 2)]
+        return [self.value() for _ in range(count)]
+
+
+    def entities(self):
+        records = {}
+        for _ in range(self.uint()):
+            type_name = self.string()
+            fields = [self.string() for _ in range(self.uint())]
+            count = self.uint()
+            ids = self.array('I')
+            alive = self.array('B')
+            columns = [self.column(count) for _ in fields]
+            for id_, is_alive, row in zip(ids, alive, zip(*columns)):
+                values = dict(zip(fields, row))
+                values['type'] = type_name
+                values['alive'] = bool(is_alive)
+                records[id_] = values
+        return records
+
+
+    def game(self):
+        magic, version = self.unpack(HEADER)
+        if magic != MAGIC:
+            raise ValueError('Not a save file')
+        if version not in (1, VERSION):
+            raise ValueError(f'Unsupported save file version {version}')
+
+        self.strings = []
+        for _ in range(self.uint()):
+            self.strings.append(str(self.bytes(self.uint()), 'utf-8'))
+
+        data = {'version': version}
+        data['map'] = self.string()
+        data['map_index'] = list(self.unpack(GRID_POS))
+        # version 1 saves are all on the overworld
+        data['grid'] = self.value() if version > 1 else 'overworld'
+        data['player'] = self.value()
+        data['items'] = self.dict(self.string, self.optional_string)
+        width, height = self.uint(), self.uint()
+        data['inventory'] = [[self.optional_string() for _ in range(height)]
+                             for _ in range(width)]
+        data['maps'] = self.dict(self.string, self.entities)
+        return data
+
+
+
+def dumps(data, maps):
+    '''
+    returns the binary save file of the game data and the map entities
+    (see saves.SaveSnapshot)
+    '''
+    writer = Writer()
+    writer.game(data, maps)
+    return writer.getvalue()
+
+
+def loads(data):
+    '''returns the saved game data like the json save, with the entities in 'maps' '''
+    return Reader(data).game()
\ No newline at end of file
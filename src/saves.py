@@ -0,0 +1,332 @@
+import pygame as pg
+import gzip
+import json
+import logging
+import os
+import queue
+import threading
+
+import items
+import savefile
+
+
+'''
+Save system
+
+Every sprite type that should be saved lists the attributes to save in a
+'save_fields' class attribute (its schema). Sprites without save fields
+(like walls) or without a Tiled object id are not saved.
+
+The SaveManager keeps the last saved values of every entity. The value dicts
+are never changed after they are made, a changed entity gets a new dict.
+So a snapshot of the game state only has to copy the entity dicts of the maps
+that changed, and encoding only serializes the entities and maps that changed
+since the last save. Snapshots are cheap enough to take on the main thread
+and can be encoded and written by the AutosaveWriter thread.
+
+Saves are written as json or in the compact binary format of savefile.py
+(chosen by the file extension). load() reads all formats.
+'''
+
+SAVE_VERSION = 2
+
+vec = pg.math.Vector2
+
+
+def snapshot(sprite):
+    '''returns the values of the sprite's save fields as json compatible types'''
+    values = {}
+    for field in sprite.save_fields:
+        value = getattr(sprite, field)
+        if isinstance(value, vec):
+            value = [value.x, value.y]
+        elif isinstance(value, dict):
+            value = dict(value)
+        values[field] = value
+    return values
+
+
+def restore(sprite, values):
+    '''sets the saved values on a sprite'''
+    for field in sprite.save_fields:
+        if field not in values:
+            continue
+        current = getattr(sprite, field, None)
+        if isinstance(current, vec):
+            # vectors are changed in place, unless they are 
+            # components (see components.py) 
+            current.update(values[field])
+            setattr(sprite, field, current)
+        else:
+            setattr(sprite, field, values[field])
+
+
+def item_name(item_class):
+    return item_class.__name__ if item_class else None
+
+
+def item_class(name):
+    return getattr(items, name) if name else None
+
+
+def write_atomic(filename, data):
+    '''
+    writes the data to a temporary file first and then replaces the old file,
+    so a crash while saving never leaves a broken save file behind
+    '''
+    temp = filename + '.tmp'
+    with open(temp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, filename)
+
+
+
+class SaveSnapshot():
+    '''
+    the state of the game at one moment
+        data: everything besides the map entities as a dict
+        maps: map key: {entity id: saved values}
+    the entity dicts must not be changed
+    '''
+    def __init__(self, data, maps):
+        self.data = data
+        self.maps = maps
+
+
+
+class SaveManager():
+    def __init__(self, game):
+        self.game = game
+        # map key: {entity id: saved values}
+        self.records = {}
+        # map key: copy of the records from the last snapshot, or None if 
+        # the map changed since then
+        self.frozen = {}
+        # map key: (frozen records, {entity id: (values, json)}, map json)
+        # the encoded json from the last save
+        self.encoded = {}
+        self.encode_lock = threading.Lock()
+        # number of entities that were serialized by the last save
+        self.serialized = 0
+
+
+    def register(self, map_key, sprite):
+        '''
+        stores the values of an entity that was spawned from the map data
+        for the first time, so it is saved as not alive if it is killed
+        before the map is saved or left
+        '''
+        if not hasattr(sprite, 'save_fields'):
+            return
+        values = snapshot(sprite)
+        values['type'] = type(sprite).__name__
+        values['alive'] = True
+        self.records.setdefault(map_key, {})[sprite.id] = values
+        self.frozen[map_key] = None
+
+
+    def update_map(self, map_key, sprites):
+        '''
+        compares the sprites of a map to their last saved values and stores
+        new values for the ones that changed. Entities of the map that don't 
+        exist anymore are saved as not alive
+        returns the number of entities that changed
+        '''
+        records = self.records.setdefault(map_key, {})
+        changed = 0
+        seen = set()
+        for sprite in sprites:
+            id_ = getattr(sprite, 'id', None)
+            if id_ is None or not hasattr(sprite, 'save_fields'):
+                continue
+            seen.add(id_)
+            values = snapshot(sprite)
+            values['type'] = type(sprite).__name__
+            values['alive'] = True
+            if records.get(id_) != values:
+                records[id_] = values
+                changed += 1
+
+        for id_, values in records.items():
+            if id_ not in seen and values['alive']:
+                records[id_] = dict(values, alive=False)
+                changed += 1
+
+        if changed:
+            self.frozen[map_key] = None
+        return changed
+
+
+    def game_data(self):
+        '''returns everything besides the map entities as a dict'''
+        game = self.game
+        return {
+                'version': SAVE_VERSION,
+                'map': game.map.key,
+                'map_index': [game.map_index_x, game.map_index_y],
+                'grid': game.overworld_grid.key,
+                'player': snapshot(game.player),
+                'items': {slot: item_name(item)
+                          for slot, item in game.player.items.items()},
+                'inventory': [[item_name(item) for item in row]
+                              for row in game.inventory.inv_items]
+                }
+
+
+    def snapshot(self):
+        '''
+        returns a SaveSnapshot of the current game state
+        only the maps that changed since the last snapshot are copied
+        '''
+        self.update_map(self.game.map.key, self.game.all_sprites)
+        for key, records in self.records.items():
+            if self.frozen.get(key) is None:
+                self.frozen[key] = dict(records)
+        return SaveSnapshot(self.game_data(), dict(self.frozen))
+
+
+    def encode(self, snapshot):
+        '''
+        returns the save file json text of a snapshot
+        this can run in another thread than the game
+        '''
+        with self.encode_lock:
+            self.serialized = 0
+            maps = []
+            for key, records in snapshot.maps.items():
+                frozen, entities, text = self.encoded.get(key, (None, {}, ''))
+                if frozen is not records:
+                    # serialize only the entities with new values
+                    for id_, values in records.items():
+                        cached = entities.get(id_)
+                        if cached is None or cached[0] is not values:
+                            entities[id_] = (values, json.dumps(values))
+                            self.serialized += 1
+                    text = '{' + ', '.join(f'"{id_}": {entities[id_][1]}'
+                                           for id_ in records) + '}'
+                    self.encoded[key] = (records, entities, text)
+                maps.append(f'{json.dumps(key)}: {text}')
+            
+            # put the map json into the game data json
+            data = json.dumps(snapshot.data)
+            return data[:-1] + f', "maps": {{{", ".join(maps)}}}}}'
+
+
+    def save(self, filename):
+        snapshot = self.snapshot()
+        if filename.endswith('.json'):
+            data = self.encode(snapshot).encode('utf-8')
+        else:
+            data = savefile.dumps(snapshot.data, snapshot.maps)
+        write_atomic(os.path.join(self.game.save_dir, filename), data)
+
+
+    def load(self, filename):
+        '''
+        reads a binary, json or compressed json save file and returns the
+        game data with the map entities in 'maps'
+        '''
+        with open(os.path.join(self.game.save_dir, filename), 'rb') as f:
+            data = f.read()
+        if savefile.is_save_file(data):
+            return savefile.loads(data)
+        if data[:2] == b'\x1f\x8b':
+            data = gzip.decompress(data)
+        data = json.loads(data.decode('utf-8'))
+        # saves before version 2 are all on the overworld
+        data.setdefault('grid', 'overworld')
+        # json object keys are strings, entity ids are ints
+        data['maps'] = {key: {int(id_): values for id_, values in records.items()}
+                        for key, records in data['maps'].items()}
+        return data
+
+
+    def clear(self, records=None):
+        '''forgets all saved entities or replaces them with loaded ones'''
+        with self.encode_lock:
+            self.records = records if records is not None else {}
+            self.frozen = {}
+            self.encoded = {}
+
+
+    def restore_game(self, data):
+        '''
+        restores the player, the item slots and the inventory of the loaded
+        game data (see load). The map entities are restored by 
+        Map.create_map after the records are set with clear(data['maps'])
+        '''
+        game = self.game
+        restore(game.player, data['player'])
+        game.player.items = {slot: item_class(name)
+                             for slot, name in data['items'].items()}
+        game.inventory.inv_items = [[item_class(name) for name in row]
+                                    for row in data['inventory']]
+
+
+
+class AutosaveWriter():
+    '''
+    encodes, compresses and writes save snapshots in a background thread
+    autosaves rotate through a number of slots (autosave0.json.gz, ...),
+    so a broken or unwanted autosave never replaces all older ones
+    if the thread is still busy, only the newest waiting snapshot is written
+    '''
+    def __init__(self, save_manager, folder, slots):
+        self.save_manager = save_manager
+        self.folder = folder
+        self.slots = slots
+        self.slot = self.oldest_slot()
+        self.queue = queue.Queue(maxsize=1)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+
+    def filename(self, slot):
+        return os.path.join(self.folder, f'autosave{slot}.json.gz')
+
+
+    def oldest_slot(self):
+        '''returns the first empty slot or the one written longest ago'''
+        def age(slot):
+            f = self.filename(slot)
+            return os.path.getmtime(f) if os.path.exists(f) else -1
+        return min(range(self.slots), key=age)
+
+
+    def submit(self, snapshot):
+        # replace a snapshot that is still waiting with the newer one
+        try:
+            self.queue.get_nowait()
+        except queue.Empty:
+            pass
+        self.queue.put(snapshot)
+
+
+    def run(self):
+        while True:
+            snapshot = self.queue.get()
+            if snapshot is None:
+                break
+            # a failed autosave (disk full, no permission) must not stop
+            # the thread, the next autosave might work again
+            try:
+                text = self.save_manager.encode(snapshot)
+                data = gzip.compress(text.encode('utf-8'), compresslevel=6)
+                write_atomic(self.filename(self.slot), data)
+                self.slot = (self.slot + 1) % self.slots
+            except Exception:
+                logging.exception('Autosave failed')
+
+
+    def close(self, timeout=10):
+        '''waits until the last autosave is written, at most timeout seconds'''
+        if not self.thread.is_alive():
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            logging.warning('Autosave writer is not responding')
+            return
+        self.thread.join(timeout)
\ No newline at end of file
@@ -39,11 +39,87 @@ FPS = 100
 
 DEFAULT_FONT = 'Arial'
 
+# ASSETS
+# number of worker threads that decode image and sound files at startup
+LOADER_THREADS = 4
+# print how long the assets took to load (wall-clock) and the decode
+# time of each asset file
+PRINT_LOAD_TIMES = False
+# load maps and texts from data/assets.bundle if it is up to date
+# (see compile_assets.py)
+USE_ASSET_BUNDLE = True
+
+# SAVES
+# autosave in the background when the player changes the map
+AUTOSAVE = True
+# number of rotating autosave files in data/saves
+AUTOSAVE_SLOTS = 3
+
+# SPRITES
+# layer number of sprites without a 'layer' attribute (see render.py)
+SPRITE_LAYER = 1
+# opacity of sprite reflections on reflective map layers (0-255)
+REFLECTION_ALPHA = 125
+# maximum number of killed sprites per class that are kept for reuse
+SPRITE_POOL_LIMIT = 512
+# size of the spatial hash cells for sprite collisions (see collisions.py)
+COLLISION_CELL_SIZE = 32
+
+# CAMERA
+# FOLLOW, CUT, SLIDE or SMOOTH (see utilities.Camera)
+CAMERA_MODE = 'FOLLOW'
+# SMOOTH: size of the area in the middle of the screen in which the player
+# moves without moving the camera (in pixels)
+CAMERA_DEADZONE = (24, 16)
+# SMOOTH: how far the camera looks ahead of the player (seconds of movement)
+CAMERA_LOOKAHEAD = 0.3
+# SMOOTH: time in seconds the camera takes to catch up (roughly)
+CAMERA_SMOOTH_TIME = 0.15
+
+# MAP TRANSITIONS
+# scroll to the next map instead of switching instantly
+SCREEN_TRANSITIONS = False
+# duration of the scrolling in seconds
+TRANSITION_TIME = 0.6
+# number of sprites of the next map that are spawned per frame
+TRANSITION_SPAWN_STEP = 16
+
+# OFF-SCREEN REGIONS
+# move the enemies of the other maps while the player is away
+# (see regions.py), this starts REGION_WORKERS worker processes
+REGION_SIMULATION = False
+# seconds between the simulation rounds
+REGION_TICK = 2.0
+# number of worker processes
+REGION_WORKERS = 2
+
+# DUNGEONS
+# start a new game in a generated dungeon instead of the overworld
+# (see dungeons.py)
+START_IN_DUNGEON = False
+# the same seed always makes the same dungeon
+DUNGEON_SEED = 1
+DUNGEON_ROOMS = 20
+
 # MUSIC
 # global volumes
 SOUND_ON = False
 MUSIC_VOLUME = 0.5
 SFX_VOLUME = 0.6
+# number of mixer channels for sound effects
+SFX_CHANNELS = 16
+# how many sounds of each category can play at the same time
+SFX_VOICE_LIMITS = {
+        'default': 4,
+        'ui': 2,
+        'weapon': 4,
+        'enemy': 8
+        }
+# memory budget in bytes for decoded sound effects
+SFX_CACHE_BUDGET = 16 * 1024 * 1024
+# fade out and fade in duration when the music changes
+# (the music is streamed, see audio.MusicPlayer)
+MUSIC_FADE_MS = 1000
 
 
 # ingame settings
@@ -59,4 +135,4 @@ PLAYER_HITBOX_SIZE = (16, 8)
 
 # effects
 #DAMAGE_ALPHA = list(range(10, 255, 50))
-DAMAGE_ALPHA = [10, 50, 100, 150, 200, 255]
+DAMAGE_ALPHA = [10, 50, 100, 150, 200, 255]
\ No newline at end of file
@@ -0,0 +1,97 @@
+'''
+Spawn registry
+
+Maps the names (or types) of Tiled objects to the factories that create
+their sprites. Sprite classes register themselves with the spawner
+decorator when the sprites module is imported:
+
+    @spawner('Enemy', 'Skeleton')
+    class Enemy(BaseSprite):
+        ...
+
+A factory is called with (game, spawn record). The spawn records of a map
+are extracted once (see spawn_batches and Map.spawn_steps), they only have
+the fields listed in the factory's 'spawn_fields' and the custom
+properties of the Tiled object. Poolable sprite classes are spawned
+through the game's sprite pools.
+'''
+
+# object name: factory
+SPAWNERS = {}
+# the object fields that are passed to factories without 'spawn_fields'
+DEFAULT_FIELDS = ('id', 'name', 'x', 'y', 'width', 'height')
+
+
+def spawner(*names):
+    '''registers a factory for Tiled objects, by default under its own name'''
+    def register(factory):
+        for name in names or [factory.__name__]:
+            if name in SPAWNERS:
+                raise ValueError(f'Tiled object "{name}" is already spawned '
+                                 f'by {SPAWNERS[name].__name__}')
+            SPAWNERS[name] = factory
+        return factory
+    return register
+
+
+def spawner_name(obj):
+    '''returns the registered name of an object (its name or its type)'''
+    name = obj.get('name')
+    if name not in SPAWNERS and obj.get('type') in SPAWNERS:
+        return obj['type']
+    return name
+
+
+def spawn_record(factory, obj):
+    '''
+    returns a dict with only the fields of a Tiled object that the factory
+    uses (its 'spawn_fields') and the custom properties of the object
+    pytmx internals like the parent map are left out
+    '''
+    fields = getattr(factory, 'spawn_fields', DEFAULT_FIELDS)
+    record = {field: obj[field] for field in fields if field in obj}
+    record.update(obj.get('properties') or {})
+    return record
+
+
+def spawn_batches(objects):
+    '''
+    groups a list of Tiled object dicts by their spawner and extracts their
+    spawn records. Returns a list of (factory, records) for spawn()
+    objects without a spawner are reported once per name
+    '''
+    batches = {}
+    unknown = {}
+    for obj in objects:
+        name = spawner_name(obj)
+        factory = SPAWNERS.get(name)
+        if factory is None:
+            unknown[name] = unknown.get(name, 0) + 1
+        else:
+            batches.setdefault(factory, []).append(spawn_record(factory, obj))
+
+    if unknown:
+        print('No spawner found for Tiled objects: ' +
+              ', '.join(f'"{name}" ({count}x)' for name, count in unknown.items()))
+    return list(batches.items())
+
+
+def spawn_steps(game, batches, skip_ids=(), step_size=None):
+    '''
+    generator that creates the sprites of the spawn batches and yields the
+    new sprites after every step_size sprites (or after every batch)
+    records with an id in skip_ids are not spawned
+    '''
+    for factory, records in batches:
+        if skip_ids:
+            records = [r for r in records if r.get('id') not in skip_ids]
+        size = step_size or len(records) or 1
+        for i in range(0, len(records), size):
+            yield game.sprite_pools.spawn_many(factory, game,
+                                               records[i:i + size])
+
+
+def spawn(game, batches, skip_ids=()):
+    '''creates all sprites of the spawn batches at once and returns them'''
+    return [sprite for sprites in spawn_steps(game, batches, skip_ids)
+            for sprite in sprites]
\ No newline at end of file
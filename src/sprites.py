@@ -2,7 +2,11 @@ import pygame as pg
 from random import choice, randint
 from itertools import cycle
 
+import collisions
+from components import ComponentSprite
 import items
+from pools import Poolable
+from spawners import spawner, DEFAULT_FIELDS
 import settings as st
 import utilities as utils
 
@@ -14,6 +18,9 @@ DOWN = 1
 LEFT = 2
 UP = 3
 
+# marks spawn attributes that the sprite didn't have before
+NOT_SET = object()
+
 
 class State():
     ''' base class for player/NPC state machine '''
@@ -40,6 +47,11 @@ class State():
 
 
 class BaseSprite(pg.sprite.Sprite):
+    # the fields of Tiled objects this sprite is spawned with (see spawners.py)
+    spawn_fields = DEFAULT_FIELDS
+    # attribute: value before the last setup set it (or NOT_SET)
+    spawn_defaults = {}
+    
     def __init__(self, game, groups, **kwargs):
         '''
         kwargs have to be at least:
@@ -50,13 +62,29 @@ class BaseSprite(pg.sprite.Sprite):
         '''
         self.game = game
         super().__init__(groups)
+        self.setup(kwargs)
+    
+    
+    def setup(self, kwargs):
+        '''
+        sets the properties (from the Tiled object) and resets the animation
+        and physics values. Pooled sprites call this again when reused
+        '''
+        # undo the attributes of the last spawn, a reused sprite must not
+        # keep custom properties that its new Tiled object doesn't have
+        for key, value in self.spawn_defaults.items():
+            if value is NOT_SET:
+                self.__dict__.pop(key, None)
+            else:
+                setattr(self, key, value)
+        self.spawn_defaults = {}
         
         for key, value in kwargs.items():
-            setattr(self, key, value)
+            self.set_spawn_attribute(key, value)
         # set additional custom properties (from Tiled 'properties' dict)
-        if hasattr(self, 'properties'):
-            for key, value in self.properties.items():
-                setattr(self, key, value)
+        if 'properties' in kwargs:
+            for key, value in kwargs['properties'].items():
+                self.set_spawn_attribute(key, value)
         
         self.anim_timer = 0
         # TODO: probably put this also in State
@@ -71,6 +99,11 @@ class BaseSprite(pg.sprite.Sprite):
         self.forces = [] # list of forces that are applied to the acc once
     
     
+    def set_spawn_attribute(self, key, value):
+        self.spawn_defaults.setdefault(key, self.__dict__.get(key, NOT_SET))
+        setattr(self, key, value)
+    
+    
     def flip_state(self):
         '''set the state to the next if the current state is done'''
         self.state.done = False
@@ -89,12 +122,16 @@ class BaseSprite(pg.sprite.Sprite):
         if self.anim_timer >= self.state.anim_delay:
             # reset the timer
             self.anim_timer -= self.state.anim_delay
-            # advance the frame
-            self.anim_frame = (self.anim_frame + 1) % len(self.images[self.image_state][self.lastdir])
-            # set the image and adjust the rect
-            self.image = self.images[self.image_state][self.lastdir][self.anim_frame]
-            self.rect = self.image.get_rect()
-            self.rect.midbottom = self.hitbox.midbottom
+            self.advance_frame()
+    
+    
+    def advance_frame(self):
+        # advance the frame
+        self.anim_frame = (self.anim_frame + 1) % len(self.images[self.image_state][self.lastdir])
+        # set the image and adjust the rect
+        self.image = self.images[self.image_state][self.lastdir][self.anim_frame]
+        self.rect = self.image.get_rect()
+        self.rect.midbottom = self.hitbox.midbottom
     
     
     def animate_flicker(self, dt):
@@ -148,11 +185,18 @@ class BaseSprite(pg.sprite.Sprite):
 
 
 
+@spawner()
 class Player(BaseSprite):
     ''' The Sprite you control as the player
     '''
+    # attributes that are saved (see saves.py)
+    save_fields = ('pos', 'lastdir', 'hp', 'max_hp', 'mana', 'max_mana', 
+                   'item_counts')
+    collision_layer = collisions.PLAYER
+    collision_mask = 0
+    
     def __init__(self, game, kwargs):
-        super().__init__(game, game.all_sprites, **kwargs)
+        super().__init__(game, [game.all_sprites, game.colliders], **kwargs)
         
         images1 = game.graphics['knight_images']
         images2 = game.graphics['knight_attack']
@@ -289,7 +333,8 @@ class Player(BaseSprite):
             self.sprite.vel *= 0
             self.sprite.image_state = 'attack'
             if self.sprite.items[self.slot]:
-                self.item = self.sprite.items[self.slot](self.sprite, self.game)
+                self.item = self.game.sprite_pools.spawn(
+                        self.sprite.items[self.slot], self.sprite, self.game)
             else:
                 self.item = None
                 self.done = True
@@ -316,6 +361,19 @@ class Player(BaseSprite):
     
     def collide_with_walls(self):
         # collision detection
+        # fast movements (like knockback) are swept against the walls, so 
+        # they can't pass through them (see components.py)
+        if (abs(self.vel.x) > self.hitbox.w / 2 or 
+                abs(self.vel.y) > self.hitbox.h / 2):
+            start = self.pos - self.vel
+            x, y, blocked_x, blocked_y = self.game.components.move_swept(
+                    start.x, start.y, self.hitbox.w, self.hitbox.h, 
+                    self.vel.x, self.vel.y)
+            self.pos.update(x, y)
+            if blocked_x:
+                self.vel.x = 0
+            if blocked_y:
+                self.vel.y = 0
         # the center of the hitbox is always at the sprite's position
         self.hitbox.centerx = self.pos.x
         utils.collide_with_walls(self, self.game.walls, 'x')
@@ -366,29 +424,30 @@ class Player(BaseSprite):
         self.acc *= 0
     
 
-# =============================================================================
-#     def draw_reflection(self, screen, rect):
-#         reflection_image = pg.transform.flip(self.image, False, True)
-#         reflection_image.fill((255, 255, 255, 125), None, pg.BLEND_RGBA_MULT)
-#         reflection_rect = reflection_image.get_rect()
-#         reflection_rect.x = rect.x
-#         reflection_rect.y = rect.y + rect.h
-#         screen.blit(reflection_image, reflection_rect)
-# =============================================================================
-        
-
 
-class Wall(BaseSprite):
+@spawner()
+class Wall(Poolable, BaseSprite):
     ''' Invisible Wall object for collisions
     '''
     def __init__(self, game, kwargs):
-        super().__init__(game, [game.all_sprites, game.walls], **kwargs)
-        
-        self.image = pg.Surface((self.width, self.height), pg.SRCALPHA)
-        self.image.fill((0, 0, 0, 0))
+        super().__init__(game, [game.all_sprites, game.walls])
+        self.image = None
+        self.activate(game, kwargs)
+    
+    
+    def activate(self, game, kwargs):
+        self.setup(kwargs)
+        if not self.image or self.image.get_size() != (self.width, self.height):
+            self.image = pg.Surface((self.width, self.height), pg.SRCALPHA)
+            self.image.fill((0, 0, 0, 0))
         self.rect = self.image.get_rect()
         self.rect.topleft = (self.x, self.y)
         self.hitbox = self.rect.copy()
+        game.components.add_wall(self)
+    
+    
+    def reset(self):
+        self.game.components.remove_wall(self)
     
     
     def update(self, dt):
@@ -403,9 +462,20 @@ class Wall(BaseSprite):
 
 # ------------------- Other sprites -------------------------------------------
             
-class Enemy(BaseSprite):
+@spawner()
+class Enemy(Poolable, ComponentSprite, BaseSprite):
+    '''
+    the states only set the acceleration, moving, wall collisions and 
+    animating are done by the systems of game.components (see components.py)
+    touching the player is handled by game.collisions (see collisions.py)
+    '''
+    save_fields = ('pos', 'lastdir', 'hp')
+    collision_layer = collisions.ENEMY
+    collision_mask = collisions.PLAYER
+    
     def __init__(self, game, kwargs):
-        super().__init__(game, [game.all_sprites, game.enemies], **kwargs)
+        super().__init__(game, [game.all_sprites, game.enemies, 
+                                game.colliders])
         
         # TODO: this is a mixup between a parent class and the skeleton
         images1 = game.graphics['enemy_skeleton'][:2]
@@ -431,31 +501,13 @@ class Enemy(BaseSprite):
                     UP: images1,
                     }
             }
-        
-        self.image_state = 'idle'
-        self.direction = DOWN
-        self.lastdir = self.direction
-        self.image = self.images[self.image_state][self.direction][0]
-        
-        self.rect = self.image.get_rect()
         self.hitbox = pg.Rect((0, 0), st.PLAYER_HITBOX_SIZE)
         
-        self.pos = vec(self.x, self.y)
-        self.hitbox.center = self.pos
-        self.rect.midbottom = self.hitbox.midbottom
-        
-        # physics properties
-        self.speed = 12
-        self.friction = 0.8
-        
         self.state_dict = {
                 'idle': self.Idle,
                 'wandering': self.Wandering,
                 'chase': self.Chase
                 }
-        self.state_name = 'wandering'
-        self.state = self.state_dict[self.state_name](self)
-        self.state.startup()
         
         # TODO: put these in a dict for each enemy
         self.aggro_dist = 60 # when the enemy starts charging at the player
@@ -464,22 +516,46 @@ class Enemy(BaseSprite):
         self.push_force = 20
         self.damage = 0.5
         
+        self.activate(game, kwargs)
     
-    def collide_with_walls(self):
-        # collision detection
-        # the center of the hitbox is always at the sprite's position
-        self.hitbox.centerx = self.pos.x
-        utils.collide_with_walls(self, self.game.walls, 'x')
-        self.hitbox.centery = self.pos.y
-        utils.collide_with_walls(self, self.game.walls, 'y')
-        # the rect(where the image is drawn)'s bottom is aligned with the hitbox's bottom
+    
+    def activate(self, game, kwargs):
+        self.setup(kwargs)
+        # physics properties
+        self.speed = 12
+        self.friction = 0.8
+        
+        self.direction = DOWN
+        self.lastdir = self.direction
+        self.image = self.images[self.image_state][self.direction][0]
+        
+        self.rect = self.image.get_rect()
+        self.pos = vec(self.x, self.y)
+        self.hitbox.center = self.pos
         self.rect.midbottom = self.hitbox.midbottom
+        
+        self.hp = 2
+        
+        self.state_name = 'wandering'
+        self.state = self.state_dict[self.state_name](self)
+        self.state.startup()
     
     
-    def collide_with_player(self):
-        player = self.game.player
-        collision = self.hitbox.colliderect(player.hitbox)
-        if collision and not player.state_name == 'hit':
+    @property
+    def image_state(self):
+        # set by the movement system
+        return 'walk' if self.moving else 'idle'
+    
+    
+    def update(self, dt):
+        super().update(dt)
+        # the animation speed of the state for the animation system
+        self.anim_delay = self.state.anim_delay
+    
+    
+    def on_collision(self, player):
+        # called by the collision manager when touching the player
+        if not player.state_name == 'hit':
             vec_to_player = player.pos - self.pos
             vec_to_player.scale_to_length(self.push_force)
             player.add_force(vec_to_player)
@@ -488,39 +564,6 @@ class Enemy(BaseSprite):
             player.state.done = True
         
     
-    def move(self, dt):
-        if self.acc.length() > 1:
-            # prevent faster diagnoal movement
-            self.acc.scale_to_length(1)
-
-        self.apply_forces(dt)
-        # laws of motion
-        self.vel += self.acc * self.speed * dt
-        self.vel *= self.friction
-        
-        speed = self.vel.length()
-        if speed < 0.1:
-            # stop and set idle image
-            self.vel *= 0
-            self.image_state = 'idle'
-        else:
-            self.image_state = 'walk'
-            # check direction
-            if self.acc.x > 0:
-                self.lastdir = RIGHT
-            elif self.acc.x < 0:
-                self.lastdir = LEFT
-            if self.acc.y > 0:
-                self.lastdir = DOWN
-            elif self.acc.y < 0:
-                self.lastdir = UP
-        self.images[self.image_state][self.lastdir]
-        
-        self.pos += self.vel
-        self.acc *= 0
-        
-    
-    
     class Idle(State):
         def __init__(self, sprite):
             super().__init__(sprite.game, sprite)
@@ -534,11 +577,6 @@ class Enemy(BaseSprite):
             dist = vec_to_player.length()
             if self.sprite.player_dist < dist <= self.sprite.aggro_dist:
                 self.done = True
-            
-            self.sprite.move(dt)
-            self.sprite.collide_with_walls()
-            self.sprite.collide_with_player()
-            self.sprite.animate(dt)
 
 
     class Wandering(State):
@@ -579,12 +617,6 @@ class Enemy(BaseSprite):
                 else:
                     self.anim_delay = 0.5
                     self.sprite.acc = vec()
-
-            self.sprite.move(dt)
-            self.sprite.collide_with_walls()
-            self.sprite.collide_with_player()
-            self.sprite.animate(dt)
-            
             
     class Chase(State):
         def __init__(self, sprite):
@@ -597,11 +629,6 @@ class Enemy(BaseSprite):
         def update(self, dt):
             vec_to_player = self.game.player.pos - self.sprite.pos
             self.sprite.acc = vec_to_player.normalize() # TODO: lerp this
-
-            self.sprite.move(dt)
-            self.sprite.collide_with_walls()
-            self.sprite.collide_with_player()
-            self.sprite.animate(dt)
             
             dist = vec_to_player.length()
             if dist > self.sprite.idle_dist or dist < self.sprite.player_dist:
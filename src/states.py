@@ -54,27 +54,75 @@ class GameStart(State):
         self.next = 'InGame'
     
     
-    def startup(self):
+    def create_grid(self, grid_key):
+        '''
+        makes game.overworld_grid from its key in save files, 'overworld' 
+        or [seed, rooms] of a generated dungeon (see dungeons.py)
+        returns the grid position of the start map and the player position
+        '''
+        if grid_key != 'overworld':
+            layout = self.game.dungeons.get_layout(*grid_key)
+            self.game.overworld_grid = self.game.dungeons.create_grid(layout)
+            start_map = self.game.overworld_grid.get_map_at(*layout.start)
+            return layout.start, start_map.properties['player_start']
+        
         # TODO: overworld grid should consist of multiple maps
         # TODO: the grid construction should be done from json data
         maps = [
-            tilemaps.Map(self.game, self.game.map_files[2]),
-            tilemaps.Map(self.game, self.game.map_files[3]),
-            tilemaps.Map(self.game, self.game.map_files[4])
+            self.game.get_map(self.game.map_files[2]),
+            self.game.get_map(self.game.map_files[3]),
+            self.game.get_map(self.game.map_files[4])
         ]
         self.game.overworld_grid = tilemaps.Grid(self.game,
                                                  name='overworld',
                                                  width=2,
-                                                 height=2)
+                                                 height=2,
+                                                 key='overworld')
         self.game.overworld_grid.insert_grid(maps[0], 0, 0)
         self.game.overworld_grid.insert_grid(maps[1], 1, 0)
         self.game.overworld_grid.insert_grid(maps[2], 0, 1)
+        return (0, 0), (182, 136)
+    
+    
+    def startup(self):
+        # remove the sprites of a running game (when loading a save)
+        for sprite in self.game.all_sprites:
+            sprite.kill()
+        self.game.components.clear()
+        self.game.regions.clear()
+        if st.REGION_SIMULATION:
+            self.game.regions.start()
+        self.game.gui_elements.empty()
+        
+        save_data = self.game.loaded_save
+        self.game.loaded_save = None
+        # a loaded game continues on the grid it was saved on
+        if save_data:
+            grid_key = save_data['grid']
+        elif st.START_IN_DUNGEON:
+            grid_key = [st.DUNGEON_SEED, st.DUNGEON_ROOMS]
+        else:
+            grid_key = 'overworld'
+        start, player_start = self.create_grid(grid_key)
 
-        self.game.map = maps[0]
+        if save_data:
+            self.game.map_index_x, self.game.map_index_y = save_data['map_index']
+            # the maps restore their entities from the loaded records
+            self.game.save_manager.clear(save_data['maps'])
+        else:
+            self.game.map_index_x, self.game.map_index_y = start
+            # a new game doesn't keep the entity states of the last one
+            self.game.save_manager.clear()
+        self.game.map = self.game.overworld_grid.get_map_at(
+                self.game.map_index_x, self.game.map_index_y)
         self.game.map.create_map()
+        
+        # decode the sound effects of the overworld in the background
+        self.game.asset_loader.prewarm_sounds('overworld')
 
         # put the player somewhere on the map
-        self.game.player = spr.Player(self.game, {'x': 182, 'y': 136,
+        self.game.player = spr.Player(self.game, {'x': player_start[0], 
+                                                  'y': player_start[1],
                                                   'width': 16, 'height': 16})
         
         self.game.inventory = inter.Inventory(self.game)
@@ -84,8 +132,11 @@ class GameStart(State):
         self.game.inventory.add_item(items.Sword, 0, 0)
         self.game.inventory.add_item(items.Test, 0, 1)
         
+        if save_data:
+            self.game.save_manager.restore_game(save_data)
+        
         self.game.camera = utils.Camera(self.game, self.game.map.size.x, 
-                                        self.game.map.size.y, 'FOLLOW')
+                                        self.game.map.size.y, st.CAMERA_MODE)
         self.game.camera.update(self.game.player)
         
         t = inter.Textbox(self.game, self.game.world_screen_rect.center, 
@@ -94,9 +145,6 @@ class GameStart(State):
         #t.activate()
         
         
-        spr.Enemy(self.game, {'x':300, 'y':100, 'width':16, 'height':16})
-        
-        
         self.game.select_menu = inter.Base_menu(self.game,
                                                 rect=None,
                                                 anchor_x='centerx')
@@ -139,7 +187,12 @@ class InGame(State):
     def update(self, dt):
         if not self.game.camera.is_sliding:
             self.game.all_sprites.update(dt)
+            self.game.components.update(dt)
+            self.game.collisions.update(self.game.colliders)
+            if st.REGION_SIMULATION:
+                self.game.regions.update(dt)
             self.game.gui_elements.update(dt)
+        self.game.map.update(dt)
         self.game.camera.update(self.game.player, dt)
         
         if self.game.keydown['START']:
@@ -153,7 +206,6 @@ class InGame(State):
 
         # map transition
         # TODO this seems wrong, refactor that map.rect is offset by gui height in display
-        # TODO: change game state to screen transition
         # TODO: put this in function(s) of map object
         change_x = 0
         change_y = 0
@@ -180,30 +232,28 @@ class InGame(State):
                 new_player_pos.y += self.game.map.rect.h
             new_x = max(0, self.game.map_index_x + change_x)
             new_y = max(0, self.game.map_index_y + change_y)
-            self.game.overworld_grid.teleport(new_x, new_y, new_player_pos)
+            if (st.SCREEN_TRANSITIONS and 
+                    self.game.overworld_grid.get_map_at(new_x, new_y)):
+                # scroll to the next map (see ScreenTransition)
+                self.game.transition = (new_x, new_y, new_player_pos, 
+                                        (change_x, change_y))
+                self.next = 'ScreenTransition'
+                self.done = True
+            else:
+                self.game.overworld_grid.teleport(new_x, new_y, new_player_pos)
         
         
     def draw(self):
         # TODO: background color
         #self.game.game_screen.fill(pg.Color('black'))
         
-        # draw map layers
-        # TODO: draw some layers above the sprites
-        # (each sprite and map layer should have a layer number)
-        for i, layer in enumerate(self.game.map.layers):
-            self.game.game_screen.blit(layer, 
-                                  self.game.camera.apply_bg(self.game.map.rect))
-            # draw reflections
-            # TODO: have the layer have a "reflection" attribute
-            if i == 0:
-                for sprite in self.game.all_sprites:
-                    if hasattr(sprite, 'draw_reflection'):
-                        sprite.draw_reflection(self.game.game_screen, 
-                                               self.game.camera.apply(sprite))
+        # draw the map layers and sprites by layer number (see render.py)
+        self.game.all_sprites.draw_world(self.game.game_screen, 
+                                         self.game.camera, self.game.map)
+        self.game.world_subpixel = self.game.camera.subpixel
         
-        for sprite in self.game.all_sprites:
-            sprite.draw(self.game.game_screen, self.game.camera.apply(sprite))
-            if self.game.debug_mode:
+        if self.game.debug_mode:
+            for sprite in self.game.all_sprites:
                 if hasattr(sprite, 'hitbox'):
                     pg.draw.rect(self.game.game_screen, pg.Color('Red'), 
                                  self.game.camera.apply_rect(sprite.hitbox), 1)
@@ -245,6 +295,93 @@ class InGame(State):
 # =============================================================================
 
 
+class ScreenTransition(State):
+    '''
+    Scrolls from the current map to the next map of the overworld grid.
+    Both maps are drawn next to each other (only their baked layers, culled
+    to the world screen) while the sprites of the next map are spawned
+    a few at a time, so there is no frame with the whole map change.
+    game.transition is (grid x, grid y, player position, direction)
+    '''
+    def __init__(self, game):
+        State.__init__(self, game)
+        self.next = 'InGame'
+    
+    
+    def startup(self):
+        grid = self.game.overworld_grid
+        self.grid_x, self.grid_y, player_pos, self.direction = self.game.transition
+        self.old_map = self.game.map
+        self.new_map = grid.get_map_at(self.grid_x, self.grid_y)
+        self.old_camera = self.game.camera
+        
+        grid.leave_map()
+        self.game.regions.enter(self.new_map.key)
+        self.new_map.bake()
+        self.spawner = self.new_map.spawn_steps(st.TRANSITION_SPAWN_STEP)
+        
+        # the player is drawn between its positions on the old and new screen
+        player = self.game.player
+        self.player_start = self.old_camera.apply(player)
+        player.pos = player_pos
+        player.hitbox.center = player.pos
+        player.rect.midbottom = player.hitbox.midbottom
+        self.new_camera = utils.Camera(self.game, self.new_map.size.x,
+                                       self.new_map.size.y, 
+                                       self.old_camera.mode)
+        self.new_camera.update(player)
+        self.player_end = self.new_camera.apply(player)
+        self.progress = 0
+    
+    
+    def update(self, dt):
+        self.progress = min(self.progress + dt / st.TRANSITION_TIME, 1)
+        # spawn the next part of the new map's sprites
+        next(self.spawner, None)
+        self.old_map.update(dt)
+        self.new_map.update(dt)
+        if self.progress == 1:
+            self.done = True
+    
+    
+    def cleanup(self):
+        # spawn what is left
+        for _ in self.spawner:
+            pass
+        self.game.camera = self.new_camera
+        self.game.overworld_grid.enter_map(self.new_map, self.grid_x, 
+                                           self.grid_y)
+    
+    
+    def draw(self):
+        screen = self.game.game_screen
+        view = self.game.world_screen_rect
+        dx, dy = self.direction
+        # the old map moves out of the screen and the new map follows it
+        shift_x = int(view.w * dx * self.progress)
+        shift_y = int(view.h * dy * self.progress)
+        old_pos = self.old_camera.apply_bg(self.old_map.rect).move(
+                -shift_x, -shift_y)
+        new_pos = self.new_camera.apply_bg(self.new_map.rect).move(
+                view.w * dx - shift_x, view.h * dy - shift_y)
+        player_rect = self.player_start.copy()
+        player_rect.x += round((self.player_end.x - player_rect.x) * self.progress)
+        player_rect.y += round((self.player_end.y - player_rect.y) * self.progress)
+        
+        screen.set_clip(view)
+        for above_sprites in (False, True):
+            self.old_map.draw_layers(screen, old_pos.topleft, above_sprites)
+            self.new_map.draw_layers(screen, new_pos.topleft, above_sprites)
+            if not above_sprites:
+                self.game.player.draw(screen, player_rect)
+        screen.set_clip(None)
+        
+        for elem in self.game.gui_elements:
+            # TODO: pass screen argument
+            elem.draw()
+
+
+
 class Dialog(InGame):
     '''
     Testing the cutscene state
@@ -1,19 +1,26 @@
 import pygame as pg
 from pytmx import TiledTileLayer, TiledObjectGroup
 from pytmx.util_pygame import load_pygame
-import inspect
+from array import array
+from itertools import chain
 
+from bundle import bundle_key
+import saves
 import settings as st
-import sprites as spr
+import spawners
+# registers the sprite classes as spawners
+import sprites
 
 vec = pg.math.Vector2
 
 
 
 class Grid():
-    def __init__(self, game, name, width, height):
+    def __init__(self, game, name, width, height, key):
         self.game = game
         self.name = name
+        # identifies the grid in save files (see GameStart.create_grid)
+        self.key = key
 
         self.map = [[None for i in range(height)] for j in range(width)]
         # TODO: should this be done in numpy?
@@ -36,37 +43,228 @@ class Grid():
             print(f'No map at {grid_x}, {grid_y}')
             return
         
+        self.leave_map()
+        new_map = self.get_map_at(grid_x, grid_y)
+        # the simulated state of the map (see regions.py)
+        self.game.regions.enter(new_map.key)
+        new_map.create_map()
+        self.game.player.pos = player_position
+        self.enter_map(new_map, grid_x, grid_y)
+    
+    
+    def leave_map(self):
+        '''removes the sprites of the current map, except the player'''
+        # remember the state of the entities on the map that is left
+        self.game.save_manager.update_map(self.game.map.key, 
+                                          self.game.all_sprites)
+        player_groups = self.game.player.groups()
         for s in self.game.all_sprites:
             s.kill()
-        self.game.all_sprites.add(self.game.player)
-        self.game.map = self.game.overworld_grid.get_map_at(grid_x, grid_y)
-        self.game.map.create_map()
-        self.game.player.pos = player_position
-        
+        self.game.player.add(player_groups)
+    
+    
+    def enter_map(self, map_, grid_x, grid_y):
+        '''makes a map with its sprites created the current map'''
+        self.game.map = map_
+        self.game.camera.set_bounds(map_.size.x, map_.size.y)
         self.game.map_index_x = grid_x
         self.game.map_index_y = grid_y
+        self.game.autosave()
+
+
+
+def load_tmx(filename):
+    '''
+    reads a Tiled map file and returns its data as a dict with
+        width, height: map size in tiles
+        tilewidth, tileheight: tile size in pixels
+        background_color
+        tile_images: list of tile images, indexed by gid (0 is empty)
+        layers: list of layer dicts in drawing order, with 
+                type ('tiles' or 'objects'), name, visible and properties
+                and either data (flat array of gids, row by row) or 
+                objects (list of object attribute dicts)
+        animations: list of [gid, [[frame gid, duration in ms], ...]] for
+                    the animated tiles
+    the asset bundle (see bundle.py) stores maps in the same structure
+    '''
+    tiled_map = load_pygame(filename)
+    layers = []
+    for layer in tiled_map.layers:
+        info = {
+                'name': layer.name,
+                'visible': bool(layer.visible),
+                'properties': layer.properties
+                }
+        if isinstance(layer, TiledTileLayer):
+            info['type'] = 'tiles'
+            info['data'] = array('I', chain.from_iterable(layer.data))
+        elif isinstance(layer, TiledObjectGroup):
+            info['type'] = 'objects'
+            info['objects'] = [obj.__dict__ for obj in layer]
+        else:
+            continue
+        layers.append(info)
+    
+    animations = []
+    for gid, properties in tiled_map.tile_properties.items():
+        frames = properties.get('frames')
+        if frames:
+            animations.append([gid, [[frame.gid, frame.duration] 
+                                     for frame in frames]])
+    
+    return {
+            'width': tiled_map.width,
+            'height': tiled_map.height,
+            'tilewidth': tiled_map.tilewidth,
+            'tileheight': tiled_map.tileheight,
+            'background_color': tiled_map.background_color,
+            'tile_images': tiled_map.images,
+            'layers': layers,
+            'animations': animations
+            }
+
+
+
+class MapLayer():
+    '''
+    a baked tile layer
+        layer: layer number for drawing order (Tiled property 'layer')
+        reflective: sprites draw their reflection on this layer
+                    (Tiled property 'reflective')
+    '''
+    def __init__(self, image, layer=0, reflective=False, animated=None):
+        self.image = image
+        self.layer = layer
+        self.reflective = reflective
+        # the animated tiles, which are not baked into the image
+        # one list of (column, animation index) per row, or None
+        self.animated = animated
 
 
 
 class Map():
-    def __init__(self, game, filename):
+    def __init__(self, game, filename, map_data=None):
+        '''
+        map_data: the map data of a generated map (see dungeons.py), the
+                  filename then only names the map
+        '''
         self.game = game
         self.filename = filename
+        # identifies the map in save files
+        self.key = bundle_key(game.base_dir, filename)
+        
+        # load map data from the compiled asset bundle if possible
+        if map_data is None:
+            map_data = game.asset_loader.load_bundled_map(filename)
+        if map_data is None:
+            map_data = load_tmx(filename)
         
-        # load map data
-        self.tiled_map = load_pygame(self.filename)
-        self.tilesize = vec(self.tiled_map.tilewidth, self.tiled_map.tileheight)
-        self.size = vec(self.tiled_map.width * self.tilesize.x, 
-                        self.tiled_map.height * self.tilesize.y)
-        self.background_color = self.tiled_map.background_color
+        self.width = map_data['width']
+        self.height = map_data['height']
+        self.tilesize = vec(map_data['tilewidth'], map_data['tileheight'])
+        self.size = vec(self.width * self.tilesize.x, 
+                        self.height * self.tilesize.y)
+        self.background_color = map_data['background_color']
+        # the map properties of generated maps, like player_start
+        self.properties = map_data.get('properties', {})
+        self.tile_images = map_data['tile_images']
+        self.layer_data = map_data['layers']
         self.layers = []
+        # the spawn batches of the object layers (see spawners.py)
+        self.spawn_batches = None
+        
+        # animated tiles: [(image, duration in ms), ...] per animation
+        self.animations = []
+        # gid: index in self.animations
+        self.animated_gids = {}
+        for gid, frames in map_data['animations']:
+            self.animated_gids[gid] = len(self.animations)
+            self.animations.append([(self.tile_images[frame_gid], duration) 
+                                    for frame_gid, duration in frames])
+        self.anim_lengths = [sum(duration for _, duration in frames)
+                             for frames in self.animations]
+        # the animation clock in ms, shared by all animated tiles
+        self.anim_time = 0
+        self.anim_frames = [frames[0][0] for frames in self.animations]
 
     def __repr__(self):
         return self.filename.split('\\')[-1]
+    
+    
+    def update(self, dt):
+        '''advances the animated tiles'''
+        if not self.animations:
+            return
+        self.anim_time += dt * 1000
+        for i, frames in enumerate(self.animations):
+            t = self.anim_time % self.anim_lengths[i]
+            for image, duration in frames:
+                if t < duration:
+                    break
+                t -= duration
+            self.anim_frames[i] = image
+    
+    
+    def draw_animated_tiles(self, screen, map_layer, map_pos):
+        '''
+        draws the current frames of the animated tiles of a layer
+        only the rows and columns inside the world screen are looked at
+        '''
+        rows = map_layer.animated
+        if not rows:
+            return
+        tw, th = int(self.tilesize.x), int(self.tilesize.y)
+        x0, y0 = map_pos
+        view = self.game.world_screen_rect
+        first_row = max(0, (view.top - y0) // th)
+        last_row = min(self.height, (view.bottom - y0) // th + 1)
+        first_col = max(0, (view.left - x0) // tw)
+        last_col = min(self.width, (view.right - x0) // tw + 1)
+        
+        frames = self.anim_frames
+        screen.blits([(frames[anim], (x0 + col * tw, y0 + row * th))
+                      for row in range(first_row, last_row)
+                      for col, anim in rows[row]
+                      if first_col <= col < last_col], False)
+    
+    
+    def draw_reflections(self, screen, camera, sprites):
+        '''
+        draws the mirrored images of the sprites below them
+        (on the layers with the 'reflective' property)
+        '''
+        cache = self.game.reflection_cache
+        ox, oy = camera.offset
+        screen.blits([(cache.get(sprite.image), 
+                       (sprite.rect.x + ox, sprite.rect.bottom + oy))
+                      for sprite in sprites], False)
         
     
+    def draw_layers(self, screen, pos, above_sprites=False):
+        '''
+        draws the tile layers below the sprites (or above them) with the 
+        map's top left corner at pos. Only the part inside the world screen
+        is drawn
+        '''
+        view = self.game.world_screen_rect
+        area = view.move(-pos[0], -pos[1]).clip((0, 0), self.rect.size)
+        dest = (pos[0] + area.x, pos[1] + area.y)
+        for map_layer in self.layers:
+            if (map_layer.layer > st.SPRITE_LAYER) == above_sprites:
+                screen.blit(map_layer.image, dest, area)
+                self.draw_animated_tiles(screen, map_layer, pos)
+    
+    
     def create_map(self):
-        '''ectracts tileset and object data from a tmx file'''
+        '''bakes the map layers and spawns the sprites of the map'''
+        self.bake()
+        for _ in self.spawn_steps():
+            pass
+    
+    
+    def bake(self):
+        '''extracts the tileset data from the map data (on the first visit)'''
         # create an empty surface 
         #self.map_image = pg.Surface(self.size)
         #self.rect = self.map_image.get_rect()
@@ -75,32 +273,80 @@ class Map():
         #    self.map_image.fill(self.background_color)
         # TODO: create a mono colored background layer
 
-        self.layers = []
+        if self.layers:
+            return
+        tw, th = int(self.tilesize.x), int(self.tilesize.y)
+        self.rect = pg.Rect((0, st.GUI_HEIGHT), self.size)
         # loop through all available layers
-        for layer in self.tiled_map:
-            if isinstance(layer, TiledTileLayer) and layer.visible:
+        for layer in self.layer_data:
+            if layer['type'] == 'tiles' and layer['visible']:
                 bg_layer_img = pg.Surface(self.size).convert_alpha()
                 # fill with transparent color
                 bg_layer_img.fill((0, 0, 0, 0))
-                self.rect = bg_layer_img.get_rect()
                 # if layer is tileset data, blit the tile image at the corresponding 
                 # position on the map image
-                for x, y, image in layer.tiles():
-                    bg_layer_img.blit(image, (x * self.tilesize.x, 
-                                              y * self.tilesize.y))
-                self.layers.append(bg_layer_img)
-            elif isinstance(layer, TiledObjectGroup) and layer.visible:
-                # if layer is an object layer, fetch the corresponding sprite
-                # from the sprites.py (spr) module
-                sprites = dict(inspect.getmembers(spr, inspect.isclass))
-                for obj in layer:
-                    if obj.name in sprites:
-                        # check if the sprite exists in sprites.py
-                        # if so, instantiate the sprite
-                        sprites[obj.name](self.game, obj.__dict__)
-                    else:
-                        print(f'No sprite "{obj.name}" found in sprites module')
-
-        self.rect.topleft = (0, st.GUI_HEIGHT)
-
+                w = self.width
+                animated_gids = self.animated_gids
+                bg_layer_img.blits([(self.tile_images[gid], 
+                                     (i % w * tw, i // w * th))
+                                    for i, gid in enumerate(layer['data']) 
+                                    if gid and gid not in animated_gids], False)
+                # index the animated tiles by row, they are drawn every frame
+                animated = None
+                if animated_gids:
+                    animated = [[] for _ in range(self.height)]
+                    for i, gid in enumerate(layer['data']):
+                        if gid in animated_gids:
+                            animated[i // w].append((i % w, animated_gids[gid]))
+                properties = layer['properties']
+                self.layers.append(MapLayer(bg_layer_img, 
+                                            properties.get('layer', 0),
+                                            properties.get('reflective', False),
+                                            animated))
 
+        # sort by layer number, layers with the same number keep their order
+        self.layers.sort(key=lambda layer: layer.layer)
+    
+    
+    def get_spawn_batches(self):
+        '''returns the spawn batches of the object layers (see spawners.py)'''
+        # the spawn records are extracted on the first visit
+        if self.spawn_batches is None:
+            self.spawn_batches = [spawners.spawn_batches(layer['objects'])
+                                  for layer in self.layer_data
+                                  if layer['type'] == 'objects' and layer['visible']]
+        return self.spawn_batches
+    
+    
+    def wall_rects(self):
+        '''returns the hitboxes of the map's walls as (x, y, w, h) tuples'''
+        return [(record['x'], record['y'], record['width'], record['height'])
+                for batches in self.get_spawn_batches()
+                for factory, records in batches if factory is sprites.Wall
+                for record in records]
+    
+    
+    def spawn_steps(self, step_size=None):
+        '''
+        generator that spawns the sprites that are registered for the object
+        names (see spawners.py), step_size sprites per step
+        '''
+        # the entity states from the last visit or a loaded save
+        save_manager = self.game.save_manager
+        saved = save_manager.records.get(self.key, {})
+        # objects killed the last time the map was visited are not spawned
+        dead = {id_ for id_, values in saved.items() if not values['alive']}
+        for batches in self.get_spawn_batches():
+            for batch in spawners.spawn_steps(self.game, batches, dead, 
+                                              step_size):
+                for sprite in batch:
+                    id_ = getattr(sprite, 'id', None)
+                    if id_ is None:
+                        continue
+                    values = saved.get(id_)
+                    if values:
+                        # continue where it was left
+                        saves.restore(sprite, values)
+                    else:
+                        save_manager.register(self.key, sprite)
+                yield
\ No newline at end of file
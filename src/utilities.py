@@ -1,5 +1,6 @@
 import pygame as pg
 import json
+import math
 
 import settings as st
 
@@ -50,6 +51,45 @@ def collide_with_walls(sprite, group, dir_):
     return False
 
 
+def swept_aabb(x, y, w, h, dx, dy, rect):
+    '''
+    continuous collision of a box (x, y: top left, w, h) that moves by 
+    (dx, dy) with a rect that doesn't move
+    returns (time of impact, normal x, normal y) with the time between 0 
+    (start) and 1 (end of the movement), or None if they don't collide.
+    Boxes that already overlap at the start are not hit
+    '''
+    if dx > 0:
+        entry_x = (rect.left - (x + w)) / dx
+        exit_x = (rect.right - x) / dx
+    elif dx < 0:
+        entry_x = (rect.right - x) / dx
+        exit_x = (rect.left - (x + w)) / dx
+    elif x + w <= rect.left or x >= rect.right:
+        return None
+    else:
+        entry_x, exit_x = -math.inf, math.inf
+
+    if dy > 0:
+        entry_y = (rect.top - (y + h)) / dy
+        exit_y = (rect.bottom - y) / dy
+    elif dy < 0:
+        entry_y = (rect.bottom - y) / dy
+        exit_y = (rect.top - (y + h)) / dy
+    elif y + h <= rect.top or y >= rect.bottom:
+        return None
+    else:
+        entry_y, exit_y = -math.inf, math.inf
+
+    entry = max(entry_x, entry_y)
+    if entry > min(exit_x, exit_y) or entry < 0 or entry > 1:
+        return None
+    # the normal points out of the side that was hit
+    if entry_x > entry_y:
+        return entry, -1 if dx > 0 else 1, 0
+    return entry, 0, -1 if dy > 0 else 1
+
+
 def difference(list1, list2):
     return [1 if elem and not list1[i] else 0 for i, elem in enumerate(list2)]
    
@@ -85,12 +125,21 @@ class Camera():
         FOLLOW: player is always in the middle of the screen
         CUT: camera pans as soon as the player leaves the screen
         SLIDE: like pan, but with a sliding animation
+        SMOOTH: follows the player when it leaves a deadzone in the middle
+                of the screen, looks ahead in the direction it moves and
+                eases with a critically damped spring
+    The world is drawn at integer positions, the subpixel part of the 
+    SMOOTH camera position is applied when the game screen is scaled to
+    the window (see Game.draw)
     '''
     def __init__(self, game, map_width, map_height, mode='FOLLOW'):
         self.game = game
         self.rect = pg.Rect(0, 0, map_width, map_height)
-        self.map_width = map_width
-        self.map_height = map_height
+        # the screen offset (camera position and GUI height) as integers
+        self.offset = (0, st.GUI_HEIGHT)
+        # rects that are reused by apply_rects
+        self.rect_buffer = []
+        self.set_bounds(map_width, map_height)
         self.mode = mode
 
         self.is_sliding = False
@@ -102,14 +151,53 @@ class Camera():
         
         self.slide_speed = 2
         self.slide_amount = 0
+        
+        # SMOOTH mode: the world position in the middle of the screen and 
+        # its velocity. The position is None until it snaps to the target
+        self.focus = None
+        self.focus_vel = vec()
+        # the fractional part of the camera position (0 <= x, y < 1)
+        self.subpixel = (0, 0)
+
+
+    def set_bounds(self, map_width, map_height):
+        '''sets the map size and the scrolling limits, when a map is loaded'''
+        self.map_width = map_width
+        self.map_height = map_height
+        self.rect.size = (map_width, map_height)
+        self.min_x = int(-(map_width - self.game.world_screen_rect.w))
+        self.min_y = int(-(map_height - self.game.world_screen_rect.h))
+        # number and size of the screen sized quadrants for CUT and SLIDE
+        self.quads_w = max(1, int(map_width) // self.game.world_screen_rect.w)
+        self.quads_h = max(1, int(map_height) // self.game.world_screen_rect.h)
+        self.quad_size_w = int(map_width) // self.quads_w
+        self.quad_size_h = int(map_height) // self.quads_h
+        # a new map is shown without easing from the old position
+        self.focus = None
 
 
     def apply(self, entity):
-        return entity.rect.move(self.rect.x, self.rect.y + st.GUI_HEIGHT)
+        return entity.rect.move(self.offset)
 
 
     def apply_rect(self, rect):
-        return rect.move(self.rect.x, self.rect.y + st.GUI_HEIGHT)
+        return rect.move(self.offset)
+    
+    
+    def apply_rects(self, rects):
+        '''
+        moves a list of rects to screen coordinates without creating new rects
+        the result is a buffer that is reused by the next call, so it is only
+        valid until then and can be longer than the list of rects
+        '''
+        buffer = self.rect_buffer
+        for _ in range(len(rects) - len(buffer)):
+            buffer.append(pg.Rect(0, 0, 0, 0))
+        offset = self.offset
+        for rect, screen_rect in zip(rects, buffer):
+            screen_rect.update(rect)
+            screen_rect.move_ip(offset)
+        return buffer
     
     
     def apply_bg(self, rect):
@@ -117,37 +205,32 @@ class Camera():
     
 
     def apply_point(self, point):
-        v = point + vec(self.rect.x, self.rect.y + st.GUI_HEIGHT)
-        return (int(v.x), int(v.y))
+        return (int(point[0] + self.offset[0]), int(point[1] + self.offset[1]))
 
 
     def update(self, target, dt=0):
         if self.mode == 'FOLLOW':
             x = -target.rect.centerx + self.game.world_screen_rect.w // 2
             y = -target.rect.centery + self.game.world_screen_rect.h // 2
+        elif self.mode == 'SMOOTH':
+            x, y = self.smooth_position(target, dt)
         elif self.mode == 'CUT':
-            # divide into quadrants
-            quads_w = self.rect.w // self.game.world_screen_rect.w
-            quads_h = self.rect.h // self.game.world_screen_rect.h
             # which quadrant the target is in.
-            qw = target.rect.centerx // (self.rect.w // quads_w)
+            qw = target.rect.centerx // self.quad_size_w
             # subtract GUI height to adapt target position to world_screen
-            qh = (target.rect.centery - st.GUI_HEIGHT) // (self.rect.h // quads_h)
+            qh = (target.rect.centery - st.GUI_HEIGHT) // self.quad_size_h
             
             x = (self.game.world_screen_rect.w) * qw * -1
             y = (self.game.world_screen_rect.h) * qh * -1
             
         elif self.mode == 'SLIDE':
-            # divide into quadrants
-            quads_w = self.rect.w // self.game.world_screen_rect.w
-            quads_h = self.rect.h // self.game.world_screen_rect.h
             # which quadrant the target is in 
-            qw = target.rect.x // (self.rect.w // quads_w)
-            qh = target.rect.y // (self.rect.h // quads_h)
+            qw = target.rect.x // self.quad_size_w
+            qh = target.rect.y // self.quad_size_h
             
             # limit the quadrants to the map
-            qw = min(max(qw, 0), quads_w - 1)
-            qh = min(max(qh, 0), quads_h - 1)
+            qw = min(max(qw, 0), self.quads_w - 1)
+            qh = min(max(qh, 0), self.quads_h - 1)
             
             self.target_pos.x = (self.game.world_screen_rect.w) * qw * -1
             self.target_pos.y = (self.game.world_screen_rect.h) * qh * -1
@@ -180,9 +263,46 @@ class Camera():
                 self.prev_qh = qh
 
         # limit scrolling to map size
-        x = min(0, x)  # left
-        x = max(-(self.map_width - self.game.world_screen_rect.w), x) # right
-        y = min(0, y)  # top
-        y = max(-(self.map_height - self.game.world_screen_rect.h), y) # bottom
+        x = max(self.min_x, min(0, x))
+        y = max(self.min_y, min(0, y))
+        # draw at whole pixels and keep the rest for scaling
+        ix = math.floor(x)
+        iy = math.floor(y)
+        self.subpixel = (x - ix, y - iy)
+        
+        self.rect.x = ix
+        self.rect.y = iy
+        self.offset = (ix, iy + st.GUI_HEIGHT)
+    
+    
+    def smooth_position(self, target, dt):
+        '''returns the camera position of the SMOOTH mode (as floats)'''
+        pos = getattr(target, 'pos', None)
+        if pos is None:
+            pos = vec(target.rect.center)
+        # look ahead in the direction the target moves, vel is the 
+        # movement of this frame (see Player.move)
+        goal = vec(pos)
+        if dt > 0:
+            goal += getattr(target, 'vel', vec()) / dt * st.CAMERA_LOOKAHEAD
+        
+        if self.focus is None:
+            self.focus = vec(goal)
+            self.focus_vel = vec()
+        else:
+            # the goal only moves the camera when it leaves the deadzone
+            dead_w, dead_h = st.CAMERA_DEADZONE
+            goal.x = clamp(self.focus.x, goal.x - dead_w / 2, goal.x + dead_w / 2)
+            goal.y = clamp(self.focus.y, goal.y - dead_h / 2, goal.y + dead_h / 2)
+            # critically damped spring, stable for any dt
+            # (Game Programming Gems 4, 1.10)
+            omega = 2 / st.CAMERA_SMOOTH_TIME
+            t = omega * dt
+            decay = 1 / (1 + t + 0.48 * t * t + 0.235 * t * t * t)
+            change = self.focus - goal
+            temp = (self.focus_vel + change * omega) * dt
+            self.focus_vel = (self.focus_vel - temp * omega) * decay
+            self.focus = goal + (change + temp) * decay
         
-        self.rect = pg.Rect(x, y, self.map_width, self.map_height)
\ No newline at end of file
+        return (-self.focus.x + self.game.world_screen_rect.w / 2,
+                -self.focus.y + self.game.world_screen_rect.h / 2)
\ No newline at end of file